@@ -2,10 +2,40 @@ import os
 import json
 from typing import Dict, Any
 
-from utils.utils import post_log
+from utils.utils import post_log, stream_json_array, stream_jsonl
 from benchflow import BaseBench
 from benchflow.schemas import BenchArgs, BenchmarkResult
 
+class SampleSummary:
+    """
+    Counts sample outcomes and keeps the first `max_samples` samples, with
+    completions and results truncated to `max_chars`, for a bounded log.
+    """
+
+    def __init__(self, max_samples: int = 20, max_chars: int = 500):
+        self.max_samples = max_samples
+        self.max_chars = max_chars
+        self.n_samples = 0
+        self.n_passed = 0
+        self.n_timed_out = 0
+        self.samples = []
+
+    def add(self, task_id: str, sample: Dict[str, Any]):
+        self.n_samples += 1
+        self.n_passed += bool(sample.get("passed"))
+        self.n_timed_out += sample.get("result") == "timed out"
+        if len(self.samples) < self.max_samples:
+            self.samples.append({
+                "task_id": task_id,
+                "completion": (sample.get("completion") or "")[:self.max_chars],
+                "result": (sample.get("result") or "")[:self.max_chars],
+                "passed": sample.get("passed"),
+            })
+
+    def counts(self) -> Dict[str, int]:
+        return {"n_samples": self.n_samples, "n_passed": self.n_passed, "n_timed_out": self.n_timed_out}
+
+
 class HumanEvalBench(BaseBench):
 
     def __init__(self):
@@ -55,39 +85,55 @@ class HumanEvalBench(BaseBench):
         }
         post_log(payload)
 
-        result_file = os.path.join(self.results_dir, "humaneval_result.json")
+        result_file = os.path.join(self.results_dir, "humaneval_results.json")
         try:
-            with open(result_file, 'r') as f:
-                result = json.load(f)
-
-            log = ''.join(json.dumps(item, ensure_ascii=False) for item in result)
-
-            def compute_average_pass_k(result):
-                """
-                calculates the average pass@k scores
-                across all tasks. Returns a dictionary with each pass@k key and its average value.
-                """
-                
-                # Dictionaries to sum values and count occurrences for each pass@k key
-                sums = {}
-                counts = {}
-                
-                for task in result:
-                    pass_k = task.get("pass@k", {})
-                    for key, value in pass_k.items():
-                        sums[key] = sums.get(key, 0) + value
-                        counts[key] = counts.get(key, 0) + 1
-                
-                # Compute average for each key
-                averages = {key: sums[key] / counts[key] for key in sums}
-                return averages
-            
+            # Stream the per-task entries and aggregate them as they are read,
+            # keeping only the first samples for the log.
+            sums = {}
+            counts = {}
+            n_tasks = 0
+            with_completions = False
+            samples = SampleSummary()
+            for task in stream_json_array(result_file):
+                n_tasks += 1
+                for key, value in task.get("pass@k", {}).items():
+                    sums[key] = sums.get(key, 0) + value
+                    counts[key] = counts.get(key, 0) + 1
+                with_completions = with_completions or "completions" in task
+                for completion in task.get("completions", ()):
+                    samples.add(task["task_id"], completion)
+
+            # With a jsonl output format the samples are in a separate file,
+            # the most recent one if a previous run used the other format.
+            files = [result_file]
+            samples_files = [os.path.join(self.results_dir, f"humaneval_samples.{output_format}")
+                             for output_format in ("jsonl", "jsonl.gz")]
+            samples_files = [samples_file for samples_file in samples_files if os.path.exists(samples_file)]
+            if not with_completions and samples_files:
+                samples_file = max(samples_files, key=os.path.getmtime)
+                files.append(samples_file)
+                for record in stream_jsonl(samples_file):
+                    samples.add(record["task_id"], record)
+
+            # Average pass@k across all tasks, the first k is the score.
+            averages = {key: sums[key] / counts[key] for key in sums}
+            metrics = {"score": next(iter(averages.values()), 0.0), **averages,
+                       "n_tasks": n_tasks, **samples.counts()}
+
+            # Bootstrap confidence intervals, only written with --bootstrap
+            other = {}
+            uncertainty_file = os.path.join(self.results_dir, "humaneval_uncertainty.json")
+            if os.path.exists(uncertainty_file):
+                files.append(uncertainty_file)
+                with open(uncertainty_file, 'r') as f:
+                    other["uncertainty"] = json.load(f)
+
             return BenchmarkResult(
                 task_id=task_id,
                 is_resolved=True,
-                metrics={"score": compute_average_pass_k(result)},
-                log={"result": log},
-                other={},
+                metrics=metrics,
+                log={"summary": metrics, "samples": samples.samples, "files": files},
+                other=other,
             )
         except Exception as e:
             return BenchmarkResult(
@@ -0,0 +1,132 @@
+import argparse
+import json
+import multiprocessing
+import resource
+import platform
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, Optional
+
+from utils.utils import read_problems
+from utils.metrics import Metrics
+from evaluate_from_api import evaluate_functional_correctness
+
+# Synthetic completion bodies, each exercising a different path of the harness.
+KINDS = {
+    "pass": None,  # the canonical solution
+    "fail": "    raise AssertionError('synthetic failure')\n",
+    "syntax_error": "    return (\n",
+    "infinite_loop": "    while True:\n        pass\n",
+    "heavy_output": "    for _ in range(2000):\n        print('x' * 1000)\n    raise AssertionError()\n",
+    "memory_hog": "    try:\n        blocks = [bytearray(64 * 1024 ** 2) for _ in range(4)]\n"
+                  "    except MemoryError:\n        raise AssertionError('memory limit')\n    raise AssertionError()\n",
+}
+
+
+def generate_completions(problems: Dict[str, Dict], kind: str, n_samples: int) -> List[Dict]:
+    """
+    Returns `n_samples` completions of `kind` for every problem. A comment
+    with the sample index keeps them distinct, so that none are deduplicated.
+    """
+    completions = []
+    for task_id, problem in problems.items():
+        body = problem["canonical_solution"] if KINDS[kind] is None else KINDS[kind]
+        for i in range(n_samples):
+            completions.append({"task_id": task_id, "completion": f"{body}\n# sample {i}\n"})
+    return completions
+
+
+def run_benchmark(problems, kind, n_samples, n_workers, timeout, engine, prescreen_samples,
+                  max_memory_bytes: Optional[int] = None) -> Dict:
+    metrics = Metrics()
+    completions = generate_completions(problems, kind, n_samples)
+
+    start = time.perf_counter()
+    results, _, _ = evaluate_functional_correctness(problems, completions, k=[1], n_workers=n_workers,
+                                                    timeout=timeout, engine=engine, cache=None, dedup="none",
+                                                    prescreen_samples=prescreen_samples, metrics=metrics,
+                                                    max_memory_bytes=max_memory_bytes)
+    elapsed = time.perf_counter() - start
+    peak_rss = max((result.get("peak_rss") or 0 for result in results), default=0)
+
+    latency = metrics.summary()["histograms"].get("exec_latency", {})
+    return {
+        "kind": kind,
+        "engine": engine,
+        "n_workers": n_workers,
+        "samples": len(completions),
+        "elapsed": elapsed,
+        "samples_per_s": len(completions) / elapsed,
+        "p50_latency": latency.get("p50"),
+        "p99_latency": latency.get("p99"),
+        "sample_peak_rss": peak_rss,
+        "memory_limited": sum(1 for result in results if result["result"] == "failed: memory limit"),
+        # ru_maxrss is a lifetime high-water mark, see `run_isolated`
+        "parent_peak_rss": _max_rss(resource.RUSAGE_SELF),
+    }
+
+
+def run_isolated(*args) -> Dict:
+    """
+    Runs `run_benchmark` in a fresh process, so that the parent's peak RSS
+    of every scenario is not masked by an earlier, bigger one.
+    """
+    with ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context("spawn")) as executor:
+        return executor.submit(run_benchmark, *args).result()
+
+
+def _max_rss(who) -> int:
+    scale = 1 if platform.uname().system == "Darwin" else 1024
+    return resource.getrusage(who).ru_maxrss * scale
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmarks the execution harness on synthetic completions.")
+    parser.add_argument("--problems_file", type=str, default="./data/HumanEval.jsonl.gz")
+    parser.add_argument("--n_tasks", type=int, default=None, help="number of problems, all by default")
+    parser.add_argument("--n_samples", type=int, default=5, help="completions per problem")
+    parser.add_argument("--kinds", nargs="+", choices=list(KINDS), default=list(KINDS))
+    parser.add_argument("--n_workers", nargs="+", type=int, default=[1, 4, 8])
+    parser.add_argument("--engine", type=str, choices=["pool", "process"], default="pool")
+    parser.add_argument("--timeout", type=float, default=1.0)
+    parser.add_argument("--no_prescreen", action="store_true")
+    parser.add_argument("--max_memory_mb", type=int, default=256,
+                        help="memory limit of every sandbox, the memory_hog samples exceed it; 0 disables it")
+    parser.add_argument("--output", type=str, default="bench_output.json")
+
+    args = parser.parse_args()
+
+    problems = read_problems(args.problems_file)
+    if args.n_tasks is not None:
+        problems = dict(list(problems.items())[:args.n_tasks])
+
+    max_memory_bytes = args.max_memory_mb * 1024 * 1024 if args.max_memory_mb else None
+    results = []
+    for kind in args.kinds:
+        for n_workers in args.n_workers:
+            results.append(run_isolated(problems, kind, args.n_samples, n_workers, args.timeout,
+                                        args.engine, not args.no_prescreen, max_memory_bytes))
+
+    report = {
+        "config": {
+            "problems_file": args.problems_file,
+            "n_tasks": len(problems),
+            "n_samples": args.n_samples,
+            "engine": args.engine,
+            "timeout": args.timeout,
+            "prescreen": not args.no_prescreen,
+            "max_memory_mb": args.max_memory_mb or None,
+            "platform": platform.platform(),
+            "python": platform.python_version(),
+        },
+        "results": results,
+    }
+    with open(args.output, "w") as fp:
+        json.dump(report, fp, indent=2)
+
+    print(f"{'kind':<14} {'workers':>7} {'samples/s':>10} {'p50 (s)':>8} {'p99 (s)':>8} {'peak RSS (MB)':>14} "
+          f"{'limited':>8}")
+    for r in results:
+        print(f"{r['kind']:<14} {r['n_workers']:>7} {r['samples_per_s']:>10.1f} "
+              f"{r['p50_latency'] or 0:>8.3f} {r['p99_latency'] or 0:>8.3f} {r['sample_peak_rss'] / 2 ** 20:>14.0f} "
+              f"{r['memory_limited']:>8}")
@@ -8,6 +8,8 @@ N_COMPLETIONS=${N_COMPLETIONS:-"1"}
 OUTPUT_DIR=${OUTPUT_DIR:-"./eval_results"}
 BASE_URL=${BASE_URL:-}
 MODEL=${MODEL:-"gpt-4o"}
+ENGINE=${ENGINE:-"pool"}
+STREAM=${STREAM:-"false"}
 
 # Parse command-line arguments to override defaults if provided
 for arg in "$@"; do
@@ -40,6 +42,14 @@ for arg in "$@"; do
       MODEL="${arg#*=}"
       shift
       ;;
+    --engine=*)
+      ENGINE="${arg#*=}"
+      shift
+      ;;
+    --stream)
+      STREAM="true"
+      shift
+      ;;
     *)
       echo "Unknown option: $arg"
       ;;
@@ -55,7 +65,14 @@ done
 # echo "OUTPUT_DIR:       $OUTPUT_DIR"
 # echo "BASE_URL:         $BASE_URL"
 # echo "MODEL:            $MODEL"
+# echo "ENGINE:           $ENGINE"
+# echo "STREAM:           $STREAM"
+
 
+EXTRA_ARGS=()
+if [ "$STREAM" = "true" ]; then
+  EXTRA_ARGS+=(--stream)
+fi
 
 # Run evaluation
 python evaluate_from_api.py \
@@ -65,6 +82,8 @@ python evaluate_from_api.py \
   --n_completions "$N_COMPLETIONS" \
   --output_dir "$OUTPUT_DIR" \
   --base_url "$BASE_URL" \
-  --model "$MODEL"
+  --model "$MODEL" \
+  --engine "$ENGINE" \
+  "${EXTRA_ARGS[@]}"
 
 # tail -f /dev/null
@@ -1,30 +1,107 @@
+import time
+# startup time up to argument parsing is reported with the first telemetry event
+_start = time.perf_counter()
+
 from collections import defaultdict, Counter
-from concurrent.futures import ThreadPoolExecutor, as_completed
-from typing import List
+from functools import partial
+from concurrent.futures import ThreadPoolExecutor, as_completed, wait, FIRST_COMPLETED
+from typing import Dict, List, Optional
 import argparse
-from os import path, makedirs
-import numpy as np
-import tqdm
+from os import path, makedirs, remove
+import hashlib
 import json
-
-from utils.utils import read_problems, estimate_pass_at_k, post_log
-from utils.execution import check_correctness
-
-from benchflow import BenchClient
+import math
+import statistics
+import sys
+
+from utils.utils import stream_jsonl, estimate_pass_at_k_batch, bootstrap_pass_at_k, pass_at_k_error_bound, post_log, JsonlWriter
+from utils.execution import check_correctness, prescreen, SandboxPool, USAGE_FIELDS
+from utils.cache import ResultCache, DEFAULT_CACHE_DIR
+from utils.journal import RunJournal
+from utils.calibration import calibrate_timeouts, save_timeout_profile, load_timeout_profile, task_timeouts
+from utils.metrics import Metrics
+from utils.distributed import Coordinator, start_local_workers
+from utils.problem_store import open_problem_store
+from utils.result_store import ResultStore
+from utils import telemetry
+from utils.import_profile import mark_startup
+
+# numpy, tqdm, requests and benchflow are imported where they are used, so
+# that the CLI starts quickly; see --import_profile.
 
 # problems path will be provided as CLI arg
 # results folder will be provided as CLI arg
 
 
+def dedup_key(completion: str, mode: str) -> bytes:
+    """
+    Returns the key under which identical completions of a task are grouped,
+    a digest so that the known results do not hold on to the completions.
+    """
+    if mode == "whitespace":
+        completion = "\n".join(line.rstrip() for line in completion.rstrip().splitlines())
+    return hashlib.blake2b(completion.encode("utf-8"), digest_size=16).digest()
+
+
 def evaluate_functional_correctness(
     problems,
     completions,
     k: List[int] = [1, 10, 100],
     n_workers: int = 4,
     timeout: float = 3.0,
+    engine: str = "pool",
+    cache: Optional[ResultCache] = None,
+    shared_cache: bool = False,
+    dedup: str = "exact",
+    n_bootstrap: int = 0,
+    writer: Optional[JsonlWriter] = None,
+    max_pending: int = 1024,
+    journal: Optional[RunJournal] = None,
+    task_timeouts: Optional[Dict[str, float]] = None,
+    prescreen_samples: bool = True,
+    max_memory_bytes: Optional[int] = None,
+    max_cpu_seconds: Optional[float] = None,
+    metrics: Optional[Metrics] = None,
+    coordinator: Optional[Coordinator] = None,
+    tolerance: Optional[float] = None,
+    pool: Optional[SandboxPool] = None,
 ):
     """
     Evaluates the functional correctness of generated samples"
+
+    :param engine: "pool" runs samples on a pool of warm sandbox workers,
+        "process" starts a new process per sample (fallback), "distributed"
+        hands samples to the workers connected to `coordinator`.
+    :param completions: a JSON string with all samples, or an iterable of
+        samples that is consumed as it is produced (streaming mode).
+    :param cache: an optional result cache consulted before running a sample.
+    :param shared_cache: the cache is shared with concurrent evaluations; it
+        is not evicted and its reported stats are cumulative over all of them.
+    :param dedup: "exact" executes byte-identical completions of a task once,
+        "whitespace" also ignores trailing whitespace, "none" disables it.
+    :param n_bootstrap: number of bootstrap resamples for the pass@k
+        confidence intervals and per-task variances, 0 disables them.
+    :param writer: if given, per-sample records are written to it as they
+        complete and the returned results do not keep the completions.
+    :param max_pending: maximum number of samples submitted but not yet collected.
+    :param task_timeouts: optional per-task timeouts, e.g. calibrated from the
+        canonical solutions; tasks without an entry use `timeout`.
+    :param prescreen_samples: statically reject samples that cannot run
+        (syntax errors, missing entry point) instead of executing them.
+    :param max_memory_bytes: optional memory limit of every sandbox.
+    :param max_cpu_seconds: optional CPU time limit of every sandbox.
+    :param metrics: optional collector of stage durations and per-sample latencies.
+    :param coordinator: the coordinator of a distributed run. Samples are
+        queued on it directly, up to `max_pending`, and its workers lease as
+        many as they have sandboxes; `n_workers` local threads are not used.
+    :param tolerance: if given, the samples of a task are evaluated in order
+        and the remaining ones are skipped once the 95% error bound of every
+        pass@k is within `tolerance`. The number of samples evaluated and
+        the error bounds of every task are returned in the uncertainty.
+    :param pool: a sandbox pool shared with other evaluations, used by the
+        "pool" engine instead of starting one; it is left open.
+    :param journal: if given, every finished sample is appended to it and
+        samples already present in it are not executed again.
     """
     payload = {
             "data": {
@@ -33,61 +110,341 @@ def evaluate_functional_correctness(
         }
     post_log(payload)
 
+    import tqdm
+
+    if metrics is None:
+        metrics = Metrics()
+
+    def run(submitted, *args):
+        metrics.observe("queue_wait", time.monotonic() - submitted)
+        return check(*args)
+
+    def submit(*args):
+        if coordinator is not None:
+            # the wait for a worker is not bounded by local threads
+            return coordinator.submit(*args)
+        return executor.submit(run, time.monotonic(), *args)
+
+    def window():
+        # samples of a task evaluated at a time in budgeted mode
+        if coordinator is not None:
+            return max(n_workers, coordinator.slots)
+        return n_workers
+
+    # Results are kept in a columnar store, in the order the samples are read.
+    results = ResultStore(keep_completions=writer is None)
+    n_prescreened = Counter()
+    n_samples = 0
+    n_skipped = 0
+    n_journaled = 0
+    n_unique = 0
+    # Budgeted mode: results of the samples in completion order, the length
+    # of the contiguous prefix that is known, and the converged tasks.
+    outcomes = defaultdict(dict)
+    prefix = Counter()
+    n_prefix_correct = Counter()
+    n_inflight = Counter()
+    converged = set()
+
+    def emit(task_id, cid, completion, result, journaled=False):
+        results.set_result(task_id, cid, result)
+        if journal is not None and not journaled:
+            journal.record(task_id, cid, completion, result)
+        if writer is not None:
+            writer.write(dict(task_id=task_id, completion_id=cid, completion=completion,
+                              result=result["result"], passed=result["passed"],
+                              **{field: result[field] for field in USAGE_FIELDS if field in result}))
+
+        if tolerance is not None:
+            outcomes[task_id][cid] = result["passed"]
+            while prefix[task_id] in outcomes[task_id]:
+                n_prefix_correct[task_id] += outcomes[task_id].pop(prefix[task_id])
+                prefix[task_id] += 1
+            n = prefix[task_id]
+            if n >= max(k) and (pass_at_k_error_bound(n, n_prefix_correct[task_id], k) <= tolerance).all():
+                converged.add(task_id)
+
+    def skip(task_id, cid, completion):
+        result = dict(task_id=task_id, passed=None, result="skipped: pass@k converged")
+        results.set_result(task_id, cid, result)
+        if writer is not None:
+            writer.write(dict(task_id=task_id, completion_id=cid, completion=completion,
+                              result=result["result"], passed=None))
+
+    # Completions of a task that share a dedup key are executed once: pending
+    # holds the completions waiting for a result, resolved the known results.
+    pending = {}
+    resolved = {}
+
+    def resolve(key, result):
+        for cid, completion in pending.pop(key):
+            emit(key[0], cid, completion, result)
+        if dedup != "none":
+            resolved[key] = result
+
+    futures = {}
+    # Resource usage of the executed samples: totals and the worst offenders.
+    usage = {"executed": 0, "wall_time": 0.0, "cpu_time": 0.0, "max_wall_time": (0.0, None),
+             "max_peak_rss": (0, None), "timed_out": 0, "timeout_wall_time": 0.0}
+
+    def account(key, result):
+        for field in ("wall_time", "spawn_latency"):
+            if result.get(field) is not None:
+                metrics.observe("exec_latency" if field == "wall_time" else field, result[field])
+        usage["executed"] += 1
+        usage["wall_time"] += result.get("wall_time") or 0.0
+        usage["cpu_time"] += result.get("cpu_time") or 0.0
+        if result["result"] == "timed out":
+            usage["timed_out"] += 1
+            usage["timeout_wall_time"] += result.get("wall_time") or 0.0
+        if (result.get("wall_time") or 0.0) > usage["max_wall_time"][0]:
+            usage["max_wall_time"] = (result["wall_time"], key[0])
+        if (result.get("peak_rss") or 0) > usage["max_peak_rss"][0]:
+            usage["max_peak_rss"] = (result["peak_rss"], key[0])
+
+    def collect(done):
+        for future in done:
+            key, cache_key = futures.pop(future)
+            n_inflight[key[0]] -= 1
+            result = future.result()
+            account(key, result)
+            if cache is not None:
+                cache.put(cache_key, result)
+            resolve(key, result)
+
+    # Sandbox zygotes come from a fork server, so the pool may be started
+    # after telemetry and other threads.
+    pool_start = time.perf_counter()
+    shared_pool = pool is not None
+    if engine == "pool":
+        if not shared_pool:
+            pool = SandboxPool(n_workers, max_memory_bytes=max_memory_bytes, max_cpu_seconds=max_cpu_seconds)
+        check = pool.check_correctness
+    elif engine == "distributed":
+        pool = None
+        check = None
+    else:
+        pool = None
+        check = partial(check_correctness, max_memory_bytes=max_memory_bytes, max_cpu_seconds=max_cpu_seconds)
+    metrics.stages["pool_startup"] += time.perf_counter() - pool_start
+
+    # Check the generated samples against test suites. A pool started
+    # here is closed however the evaluation ends.
+    harness_stats = None
+    try:
+        execution_start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=n_workers) as executor:
+
+            if isinstance(completions, (str, bytes)):
+                completions = json.loads(completions)
+
+            # Samples are submitted as soon as they are read, so a streamed
+            # completion set is executed while the agent is still generating.
+            print("Reading samples...")
+            for sample in tqdm.tqdm(completions):
+                task_id = sample["task_id"]
+                if task_id not in problems:
+                    # e.g. a subset of the tasks is evaluated
+                    continue
+                completion = sample["completion"]
+                cid = results.add(sample)
+                n_samples += 1
+
+                if tolerance is not None:
+                    # Evaluate a task's samples a few at a time so that it can stop early.
+                    while n_inflight[task_id] >= window() and task_id not in converged:
+                        collect(wait(futures, return_when=FIRST_COMPLETED).done)
+                    if task_id in converged:
+                        skip(task_id, cid, completion)
+                        n_skipped += 1
+                        continue
+
+                key = (task_id, dedup_key(completion, dedup) if dedup != "none" else cid)
+                if journal is not None:
+                    journaled = journal.lookup(task_id, cid, completion)
+                    if journaled is not None:
+                        emit(task_id, cid, completion, journaled, journaled=True)
+                        n_journaled += 1
+                        continue
+                if key in resolved:
+                    emit(task_id, cid, completion, resolved[key])
+                    continue
+                if key in pending:
+                    pending[key].append((cid, completion))
+                    continue
+                pending[key] = [(cid, completion)]
+                n_unique += 1
+
+                if prescreen_samples:
+                    screened = prescreen(problems[task_id], completion)
+                    if screened is not None:
+                        n_prescreened[screened[0]] += 1
+                        resolve(key, dict(task_id=task_id, passed=False, result=screened[1]))
+                        continue
+
+                task_timeout = task_timeouts.get(task_id, timeout) if task_timeouts else timeout
+
+                cache_key = None
+                if cache is not None:
+                    cache_key = cache.key(problems[task_id], completion, task_timeout,
+                                          max_memory_bytes, max_cpu_seconds)
+                    cached = cache.get(cache_key)
+                    if cached is not None:
+                        resolve(key, dict(task_id=task_id, **cached))
+                        continue
+
+                args = (problems[task_id], completion, task_timeout, cid)
+                future = submit(*args)
+                futures[future] = (key, cache_key)
+                n_inflight[task_id] += 1
+
+                # Bound the number of samples held in flight.
+                if len(futures) >= max_pending:
+                    collect(wait(futures, return_when=FIRST_COMPLETED).done)
+
+            assert len(results.task_ids) == len(problems), "Some problems are not attempted."
+
+            print("Running test suites...")
+            collect(tqdm.tqdm(as_completed(list(futures)), total=len(futures)))
+
+        if pool is not None and not shared_pool:
+            harness_stats = pool.compile_stats()
+    finally:
+        if pool is not None and not shared_pool:
+            pool.close()
+
+    execution_time = time.perf_counter() - execution_start
+    # samples skipped by the sampling budget or restored from the journal
+    # were neither deduplicated nor evaluated
+    n_considered = n_samples - n_skipped - n_journaled
+    metrics.stages["execution"] += execution_time
+    metrics.count("samples", n_samples)
+    metrics.count("skipped", n_skipped)
+    metrics.count("journaled", n_journaled)
+    metrics.count("executed", usage["executed"])
+    metrics.count("unique", n_unique)
+    metrics.count("prescreened", sum(n_prescreened.values()))
+    metrics.count("timed_out", usage["timed_out"])
+    metrics.set("throughput_samples_per_s", n_considered / execution_time if execution_time else 0.0)
+
+    if usage["executed"]:
+        print(f"Resources: {usage['executed']} samples executed, "
+              f"{usage['wall_time'] / usage['executed']:.3f}s mean wall time, "
+              f"{usage['cpu_time']:.1f}s total CPU time, "
+              f"slowest {usage['max_wall_time'][0]:.2f}s ({usage['max_wall_time'][1]}), "
+              f"peak RSS {usage['max_peak_rss'][0] / 2 ** 20:.0f}MB ({usage['max_peak_rss'][1]})")
+        print(f"Timeouts: {usage['timed_out']} samples timed out, "
+              f"{usage['timeout_wall_time']:.1f}s of wall time lost")
+
+    if journal is not None and n_journaled:
+        print(f"Resume: {n_journaled} samples restored from the journal")
+
+    if prescreen_samples:
+        print(f"Prescreening: rejected {sum(n_prescreened.values())} samples without a sandbox "
+              f"({dict(n_prescreened)})")
+
+    if dedup != "none":
+        print(f"Deduplication: {n_unique} unique of {n_considered} samples "
+              f"({1 - n_unique / n_considered if n_considered else 0.0:.1%} deduplicated)")
+
+    if harness_stats is not None:
+        print(f"Test harness: compiled {harness_stats['compiled']} times, reused {harness_stats['reused']} times, "
+              f"{harness_stats['saved_time'] * 1000:.1f}ms of compilation saved")
+
+    if coordinator is not None:
+        print(f"Distributed: {coordinator.stats['workers']} workers connected, "
+              f"{coordinator.stats['stolen']} samples stolen, "
+              f"{coordinator.stats['requeued']} requeued from lost workers")
+
+    if cache is not None:
+        if not shared_cache:
+            cache.evict()
+        stats = cache.stats()
+        print(f"Result cache{' (cumulative over concurrent runs)' if shared_cache else ''}: "
+              f"{stats['hits']} hits, {stats['misses']} misses ({stats['hit_rate']:.1%} hit rate)")
+
+    # Calculate pass@k for all tasks and all k at once.
+    task_ids, total, correct = results.counts()
+
+    with metrics.stage("pass_at_k"):
+        pass_at_k = estimate_pass_at_k_batch(total, correct, k)
+    scores = [
+        {task_id: {f"pass@{ks}": row[j].item() for j, ks in enumerate(k) if not math.isnan(row[j])}}
+        for task_id, row in zip(task_ids, pass_at_k)
+    ]
+    print(scores)
+
+    uncertainty = None
+    if n_bootstrap > 0:
+        with metrics.stage("bootstrap"):
+            uncertainty = bootstrap_pass_at_k(total, correct, k, n_resamples=n_bootstrap)
+        uncertainty["task_variance"] = {
+            task_id: {key: row[j].item() for j, key in enumerate(uncertainty["pass@k"])}
+            for task_id, row in zip(task_ids, uncertainty["task_variance"])
+        }
+        print(uncertainty["pass@k"])
+
+    if tolerance is not None:
+        uncertainty = uncertainty or {}
+        uncertainty["budget"] = {"tolerance": tolerance, "n_samples": n_samples,
+                                 "n_evaluated": int(total.sum()), "n_converged": len(converged)}
+        uncertainty["task_budget"] = {
+            task_id: {"n_evaluated": int(n), "error_bound": {
+                f"pass@{ks}": bound.item() for ks, bound in zip(k, pass_at_k_error_bound(n, c, k)) if ks <= n
+            }}
+            for task_id, n, c in zip(task_ids, total, correct)
+        }
+        print(f"Sampling budget: evaluated {total.sum()} of {n_samples} samples, "
+              f"{len(converged)} of {len(task_ids)} tasks converged within {tolerance}")
+    return results, scores, uncertainty
 
-    # Check the generated samples against test suites.
-    with ThreadPoolExecutor(max_workers=n_workers) as executor:
 
-        futures = []
-        completion_id = Counter()
-        n_samples = 0
-        results = defaultdict(list)
+def agent_env(problems, k, n_completions, base_url=None, model=None):
+    """
+    Returns the inputs of the agent. Every problem of the store is parsed
+    for them, so they are only built when the agent is called.
+    """
+    env = {
+        "problems": dict(problems),
+        "k": k,
+        "n_completions": n_completions
+    }
+    if base_url or model:
+        # the agent generates the completions with this API, see HumanEvalAgent.generation_args
+        env["api"] = {"base_url": base_url, "model": model}
+    return env
 
-        print("Reading samples...")
-        for sample in tqdm.tqdm(json.loads(completions)):
-            task_id = sample["task_id"]
-            completion = sample["completion"]
-            args = (problems[task_id], completion, timeout, completion_id[task_id])
-            future = executor.submit(check_correctness, *args)
-            futures.append(future)
-            completion_id[task_id] += 1
-            n_samples += 1
 
-        assert len(completion_id) == len(problems), "Some problems are not attempted."
+def start_coordinator(coordinator_address=None, local_workers=0, n_workers=4, max_memory_bytes=None,
+                      max_cpu_seconds=None):
+    """
+    Starts the coordinator of a distributed run on `coordinator_address`
+    (host:port) and `local_workers` worker processes with `n_workers`
+    sandboxes each on this machine.
+    Returns the coordinator and the worker processes, see `stop_coordinator`.
+    """
+    host, port = (coordinator_address or "127.0.0.1:7777").rsplit(":", 1)
+    coordinator = Coordinator(host, int(port), max_memory_bytes=max_memory_bytes,
+                              max_cpu_seconds=max_cpu_seconds)
+    print(f"Coordinator listening on {coordinator.address[0]}:{coordinator.address[1]}")
+    workers = []
+    if local_workers:
+        workers = start_local_workers(f"127.0.0.1:{coordinator.address[1]}", local_workers, n_workers,
+                                      token=coordinator.token)
+    return coordinator, workers
 
-        print("Running test suites...")
-        for future in tqdm.tqdm(as_completed(futures), total=len(futures)):
-            result = future.result()
-            results[result["task_id"]].append((result["completion_id"], result))
-
-    # Calculate pass@k.
-    scores = []
-    for result in results.values():
-        total, correct = [], [],
-        result.sort()
-        passed = [r[1]["passed"] for r in result]
-        total.append(len(passed))
-        correct.append(sum(passed))
-        total_np = np.array(total)
-        correct_np = np.array(correct)
-
-        ks = k
-        pass_at_k = {f"pass@{k}": estimate_pass_at_k(total_np, correct_np, k).mean().item()
-                    for k in ks if (total_np >= k).all()}
-        scores.append({result[0][1]["task_id"]: pass_at_k})
-    print(scores)
-    # Finally, save the results in one file:
-    def combine_results():
-        for sample in json.loads(completions):
-            task_id = sample["task_id"]
-            result = results[task_id].pop(0)
-            sample["result"] = result[1]["result"]
-            sample["passed"] = result[1]["passed"]
-            yield sample
 
-    return combine_results(), scores
+def stop_coordinator(coordinator, workers):
+    coordinator.close()
+    for worker in workers:
+        worker.wait()
 
 
-def evaluate(intelligence_url, problem_file, k, n_completions, out_dir):
+def evaluate(intelligence_url, problem_file, k, n_completions, out_dir, engine="pool", cache=None,
+             dedup="exact", stream=False, n_bootstrap=0, output_format="json", resume=False,
+             timeout=3.0, timeout_profile=None, prescreen_samples=True, max_memory_bytes=None,
+             max_cpu_seconds=None, n_workers=4, coordinator_address=None, local_workers=0,
+             task_ids=None, tolerance=None, save_npz=False, base_url=None, model=None):
 
     payload = {
             "data": {
@@ -96,27 +453,214 @@ def evaluate(intelligence_url, problem_file, k, n_completions, out_dir):
         }
     post_log(payload)
 
-    bench_client = HumanEvalClient(intelligence_url)
-    problems = read_problems(problem_file)
+    metrics = Metrics()
+    run_start = time.perf_counter()
 
-    env = {
-        "problems": problems,
-        "k": k,
-        "n_completions": n_completions
-    }
+    with metrics.stage("load_problems"):
+        problems = open_problem_store(problem_file, task_ids)
+
+    # the completion set and the finished samples are kept on disk until the
+    # results are saved, so that an interrupted run can be resumed
+    completions_file = path.join(out_dir, "humaneval_completions.json")
+    journal = RunJournal(path.join(out_dir, "humaneval_journal.jsonl"), resume=resume)
 
     # get completions from the agent
-    response = bench_client.get_response(env)
-    completions = response["raw_response"]
+    if resume and path.exists(completions_file):
+        with open(completions_file, "r") as fp:
+            completions = fp.read()
+    else:
+        # the client pulls in benchflow, only import it when the agent is called
+        from humaneval_client import HumanEvalClient
+
+        bench_client = HumanEvalClient(intelligence_url)
+        env = agent_env(problems, k, n_completions, base_url=base_url, model=model)
+        if stream:
+            # a streamed completion set is not persisted, on resume only the
+            # samples whose completion is unchanged are taken from the journal
+            completions = bench_client.stream_response(env)
+        else:
+            with metrics.stage("agent_round_trip"):
+                response = bench_client.get_response(env)
+            completions = response["raw_response"]
+            if not isinstance(completions, str):
+                completions = json.dumps(completions)
+            with open(completions_file, "w") as fp:
+                fp.write(completions)
+
+    # in distributed mode samples are executed by workers connected to the coordinator
+    coordinator, workers = None, []
+    if engine == "distributed":
+        coordinator, workers = start_coordinator(coordinator_address, local_workers, n_workers,
+                                                 max_memory_bytes=max_memory_bytes,
+                                                 max_cpu_seconds=max_cpu_seconds)
+
+    # with a jsonl output format the per-sample records are written as they complete
+    writer = None
+    if output_format != "json":
+        writer = JsonlWriter(path.join(out_dir, f"humaneval_samples.{output_format}"))
 
     # evaluate the completions and get results and pass@k scores
-    results, scores = evaluate_functional_correctness(problems, completions, k)
-
-    formatted_result = format_result(results, scores)
+    try:
+        results, scores, uncertainty = evaluate_functional_correctness(problems, completions, k, engine=engine,
+                                                                       cache=cache, dedup=dedup,
+                                                                       n_bootstrap=n_bootstrap,
+                                                                       writer=writer, journal=journal,
+                                                                       timeout=timeout,
+                                                                       task_timeouts=timeout_profile,
+                                                                       prescreen_samples=prescreen_samples,
+                                                                       max_memory_bytes=max_memory_bytes,
+                                                                       max_cpu_seconds=max_cpu_seconds,
+                                                                       metrics=metrics,
+                                                                       n_workers=n_workers,
+                                                                       coordinator=coordinator,
+                                                                       tolerance=tolerance)
+    finally:
+        journal.close()
+        if coordinator is not None:
+            stop_coordinator(coordinator, workers)
+        if writer is not None:
+            writer.close()
+
+    with metrics.stage("format_result"):
+        formatted_result = format_result(results, scores, uncertainty)
     # print("formatted res ", formatted_result)
-    save_result(formatted_result, out_dir)
+    with metrics.stage("save_result"):
+        save_result(formatted_result, out_dir)
+        if uncertainty is not None:
+            save_uncertainty(uncertainty, out_dir)
+        if save_npz:
+            results.save_npz(path.join(out_dir, "humaneval_results.npz"))
+
+    problems.close()
+    metrics.stages["total"] = time.perf_counter() - run_start
+    metrics.save(path.join(out_dir, "humaneval_metrics.json"))
+
+    # the run is complete, nothing left to resume
+    for file_path in (journal.filename, completions_file):
+        if path.exists(file_path):
+            remove(file_path)
+
+def evaluate_batch(sources, problem_file, k, n_completions, out_dir, engine="pool", cache=None,
+                   dedup="exact", n_bootstrap=0, output_format="json", timeout=3.0, timeout_profile=None,
+                   prescreen_samples=True, max_memory_bytes=None, max_cpu_seconds=None, n_workers=4,
+                   coordinator_address=None, local_workers=0, task_ids=None, tolerance=None,
+                   save_npz=False, base_url=None, model=None):
+    """
+    Evaluates several completion sets against the same problems in one
+    process. `sources` maps a run name to a completions file (.json, .jsonl or
+    .jsonl.gz) or an agent URL. The problems, sandbox pool (or coordinator)
+    and result cache are shared and the runs are evaluated concurrently, so
+    their samples are interleaved on the same workers.
+
+    Every run is written to out_dir/<name>/ as by `evaluate`, and the mean
+    pass@k of all runs to out_dir/humaneval_comparison.json.
+    """
+    payload = {
+            "data": {
+                "message": f"[HUMANEVAL Client]: evaluating {len(sources)} runs"
+            }
+        }
+    post_log(payload)
 
-def format_result(results, scores):
+    problems = open_problem_store(problem_file, task_ids)
+    env = None
+    if any(source.startswith(("http://", "https://")) for source in sources.values()):
+        env = agent_env(problems, k, n_completions, base_url=base_url, model=model)
+
+    pool, coordinator, workers = None, None, []
+    if engine == "pool":
+        pool = SandboxPool(n_workers, max_memory_bytes=max_memory_bytes, max_cpu_seconds=max_cpu_seconds)
+    elif engine == "distributed":
+        coordinator, workers = start_coordinator(coordinator_address, local_workers, n_workers,
+                                                 max_memory_bytes=max_memory_bytes,
+                                                 max_cpu_seconds=max_cpu_seconds)
+
+    def run(name, source):
+        run_dir = path.join(out_dir, name)
+        makedirs(run_dir, exist_ok=True)
+        metrics = Metrics()
+        run_start = time.perf_counter()
+
+        if source.startswith(("http://", "https://")):
+            from humaneval_client import HumanEvalClient
+
+            with metrics.stage("agent_round_trip"):
+                completions = HumanEvalClient(source).get_response(env)["raw_response"]
+            if not isinstance(completions, str):
+                completions = json.dumps(completions)
+        elif source.endswith((".jsonl", ".jsonl.gz")):
+            completions = stream_jsonl(source)
+        else:
+            with open(source, "r") as fp:
+                completions = fp.read()
+
+        writer = None
+        if output_format != "json":
+            writer = JsonlWriter(path.join(run_dir, f"humaneval_samples.{output_format}"))
+        try:
+            results, scores, uncertainty = evaluate_functional_correctness(
+                problems, completions, k, n_workers=n_workers, timeout=timeout, engine=engine, cache=cache,
+                shared_cache=True, dedup=dedup, n_bootstrap=n_bootstrap, writer=writer, task_timeouts=timeout_profile,
+                prescreen_samples=prescreen_samples, max_memory_bytes=max_memory_bytes,
+                max_cpu_seconds=max_cpu_seconds, metrics=metrics, coordinator=coordinator,
+                tolerance=tolerance, pool=pool)
+        finally:
+            if writer is not None:
+                writer.close()
+
+        with metrics.stage("save_result"):
+            save_result(format_result(results, scores, uncertainty), run_dir)
+            if uncertainty is not None:
+                save_uncertainty(uncertainty, run_dir)
+            if save_npz:
+                results.save_npz(path.join(run_dir, "humaneval_results.npz"))
+        metrics.stages["total"] = time.perf_counter() - run_start
+        metrics.save(path.join(run_dir, "humaneval_metrics.json"))
+
+        # mean pass@k over the tasks, as reported by the benchmark
+        totals = defaultdict(list)
+        for score in scores:
+            for key, value in next(iter(score.values())).items():
+                totals[key].append(value)
+        return {"source": source, "pass@k": {key: statistics.fmean(values) for key, values in totals.items()},
+                "n_samples": metrics.counters["samples"]}
+
+    harness_stats = None
+    try:
+        with ThreadPoolExecutor(max_workers=len(sources)) as executor:
+            futures = {name: executor.submit(run, name, source) for name, source in sources.items()}
+            comparison = {name: future.result() for name, future in futures.items()}
+        if pool is not None:
+            harness_stats = pool.compile_stats()
+    finally:
+        if pool is not None:
+            pool.close()
+        if coordinator is not None:
+            stop_coordinator(coordinator, workers)
+        problems.close()
+
+    with open(path.join(out_dir, "humaneval_comparison.json"), "w") as fp:
+        json.dump(comparison, fp, indent=2)
+
+    keys = [f"pass@{ks}" for ks in k]
+    width = max(len(name) for name in comparison)
+    print(f"{'run':<{width}}  {'samples':>8}  " + "  ".join(f"{key:>9}" for key in keys))
+    for name, entry in comparison.items():
+        print(f"{name:<{width}}  {entry['n_samples']:>8}  " + "  ".join(
+            f"{entry['pass@k'][key]:>9.4f}" if key in entry["pass@k"] else f"{'-':>9}" for key in keys))
+
+    # the pool and the cache are shared, their stats cover all runs
+    if harness_stats is not None:
+        print(f"Test harness: compiled {harness_stats['compiled']} times, reused {harness_stats['reused']} times, "
+              f"{harness_stats['saved_time'] * 1000:.1f}ms of compilation saved")
+    if cache is not None:
+        cache.evict()
+        stats = cache.stats()
+        print(f"Result cache: {stats['hits']} hits, {stats['misses']} misses ({stats['hit_rate']:.1%} hit rate)")
+    return comparison
+
+
+def format_result(results, scores, uncertainty=None):
 
     payload = {
             "data": {
@@ -125,31 +669,44 @@ def format_result(results, scores):
         }
     post_log(payload)
 
-    # Group all fields by task_id
-    grouped = {}
-    for entry in results:
-        task_id = entry['task_id']
-        # Create the group if it doesn't exist
-        if task_id not in grouped:
-            grouped[task_id] = []
-        # Exclude the task_id from the individual completion entry to avoid redundancy
-        completion_entry = {k: v for k, v in entry.items() if k != 'task_id'}
-        grouped[task_id].append(completion_entry)
+    # A result store gives the samples of a task on demand, other results are
+    # grouped by task_id. Without completions (the samples were written to a
+    # jsonl file) only the per-task summary is built.
+    grouped = defaultdict(list)
+    if isinstance(results, ResultStore):
+        with_completions = results.keep_completions
+    else:
+        with_completions = results is not None
+        for entry in results or ():
+            # Exclude the task_id from the individual completion entry to avoid redundancy
+            grouped[entry['task_id']].append({k: v for k, v in entry.items() if k != 'task_id'})
+
+    def completions_of(task_id):
+        if isinstance(results, ResultStore):
+            return list(results.task_records(task_id))
+        return grouped.get(task_id, [])
 
     # Create a dictionary mapping task_id to pass@k value
     score_dict = {list(score.keys())[0]: list(score.values())[0] for score in scores}
+    variance_dict = (uncertainty or {}).get("task_variance", {})
+    budget_dict = (uncertainty or {}).get("task_budget", {})
 
-    # Build the final result
-    result = [
-        {
-            "task_id": task_id,
-            "completions": completions,
-            "pass@k": score_dict.get(task_id)
-        }
-        for task_id, completions in grouped.items()
-    ]
+    # Build the final result task by task as it is consumed, so that only one
+    # task's completions are materialized at a time
+    def build():
+        for task_id, pass_at_k in score_dict.items():
+            entry = {"task_id": task_id}
+            if with_completions:
+                entry["completions"] = completions_of(task_id)
+            entry["pass@k"] = pass_at_k
+            if variance_dict:
+                entry["pass@k_variance"] = variance_dict.get(task_id)
+            if budget_dict:
+                entry["n_evaluated"] = budget_dict[task_id]["n_evaluated"]
+                entry["pass@k_error_bound"] = budget_dict[task_id]["error_bound"]
+            yield entry
 
-    return result
+    return build()
 
 
 
@@ -163,21 +720,33 @@ def save_result(result, out_dir):
     post_log(payload)
     # print('result ', result)
     output_file_path = path.join(out_dir, "humaneval_results.json")
-    with open(output_file_path, "wb") as fp:
-        fp.write(json.dumps(result).encode('utf-8'))
+    # serialize task by task instead of building one string for the whole run
+    with open(output_file_path, "w", encoding="utf-8") as fp:
+        fp.write("[")
+        for i, entry in enumerate(result):
+            if i:
+                fp.write(", ")
+            fp.write(json.dumps(entry))
+        fp.write("]")
+
 
-class HumanEvalClient(BenchClient):
+def save_uncertainty(uncertainty, out_dir):
+    """
+    Writes the bootstrap confidence intervals of the mean pass@k and the
+    sampling budget summary next to the results.
+    """
+    summary = {key: value for key, value in uncertainty.items() if key not in ("task_variance", "task_budget")}
+    output_file_path = path.join(out_dir, "humaneval_uncertainty.json")
+    with open(output_file_path, "w") as fp:
+        json.dump(summary, fp, indent=2)
 
-    def __init__(self, intelligent_url):
-        super().__init__(intelligent_url, 3)
+def __getattr__(name):
+    # The client pulls in benchflow, which is only imported when it is used.
+    if name == "HumanEvalClient":
+        from humaneval_client import HumanEvalClient
+        return HumanEvalClient
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
-    def prepare_input(self, raw_input_data):
-        return raw_input_data
-    
-    def parse_response(self, raw_response):
-        # print("this is the resp ", (raw_response))
-        return {"response" : raw_response}
-    
 
 if __name__ == "__main__":
     # evaluate(
@@ -187,26 +756,166 @@ if __name__ == "__main__":
     #     n_completions=6,
     #     out_file_path="./output.json"
     # )
-    payload = {
-            "data": {
-                "message": "[HUMANEVAL Client]: running" 
-            }
-        }
-    post_log(payload)
-
-
     parser = argparse.ArgumentParser()
 
     parser.add_argument("--intelligence_url", type=str)
+    parser.add_argument("--sources", nargs="+", type=str, default=None,
+                        help="batch mode: evaluate several [name=]<completions file or agent URL> "
+                             "with one shared pool and write a comparison table")
     parser.add_argument("--problems_file", type=str)
     parser.add_argument("--k", nargs="+", type=int)
     parser.add_argument("--n_completions", type=int)
+    parser.add_argument("--task_ids", nargs="+", type=str, default=None,
+                        help="evaluate only these tasks, all by default")
     parser.add_argument("--output_dir", type=str)
-    parser.add_argument("--base_url", type=str, required=False)
-    parser.add_argument("--model", type=str, required=False)
+    parser.add_argument("--base_url", type=str, required=False,
+                        help="OpenAI-compatible API the agent generates the completions with")
+    parser.add_argument("--model", type=str, required=False, help="model the agent generates with")
+    parser.add_argument("--engine", type=str, choices=["pool", "process", "distributed"], default="pool")
+    parser.add_argument("--n_workers", type=int, default=4,
+                        help="sandbox workers, or sandboxes of every local worker with the distributed engine")
+    parser.add_argument("--coordinator", type=str, default="127.0.0.1:7777",
+                        help="host:port the coordinator of a distributed run listens on; workers are "
+                             "started with python -m utils.distributed --coordinator <host>:<port>. "
+                             "To accept remote workers listen on 0.0.0.0 and set the same "
+                             "$HUMANEVAL_COORDINATOR_TOKEN for the coordinator and the workers")
+    parser.add_argument("--local_workers", type=int, default=0,
+                        help="worker processes started on this host for a distributed run")
+    parser.add_argument("--dedup", type=str, choices=["exact", "whitespace", "none"], default="exact")
+    parser.add_argument("--stream", action="store_true",
+                        help="execute completions while the agent streams them")
+    parser.add_argument("--bootstrap", type=int, default=0,
+                        help="number of bootstrap resamples for pass@k confidence intervals")
+    parser.add_argument("--tolerance", type=float, default=None,
+                        help="stop evaluating a task's samples once the error bound of every pass@k "
+                             "is within this tolerance")
+    parser.add_argument("--telemetry", type=str, choices=["remote", "file", "off"], default=None,
+                        help="telemetry sink, defaults to $HUMANEVAL_TELEMETRY or remote")
+    parser.add_argument("--telemetry_file", type=str, default=None)
+    parser.add_argument("--output_format", type=str, choices=["json", "jsonl", "jsonl.gz"], default="json",
+                        help="jsonl formats stream per-sample records to humaneval_samples.<format> "
+                             "and keep only per-task summaries in humaneval_results.json")
+    parser.add_argument("--npz", action="store_true",
+                        help="also write the per-sample results as columnar arrays to humaneval_results.npz, "
+                             "see utils.result_store.ResultStore.load_npz")
+    parser.add_argument("--resume", action="store_true",
+                        help="reuse the completions and finished samples of an interrupted run in output_dir")
+    parser.add_argument("--timeout", type=float, default=3.0, help="timeout per sample in seconds")
+    parser.add_argument("--timeout_profile", type=str, default=None,
+                        help="per-task timeout profile, calibrated from the canonical solutions if missing")
+    parser.add_argument("--calibrate", action="store_true", help="recalibrate the timeout profile")
+    parser.add_argument("--timeout_multiplier", type=float, default=10.0)
+    parser.add_argument("--timeout_floor", type=float, default=0.5)
+    parser.add_argument("--timeout_ceiling", type=float, default=10.0)
+    parser.add_argument("--no_prescreen", action="store_true",
+                        help="run every sample in the sandbox, even if it does not parse")
+    parser.add_argument("--max_memory_mb", type=int, default=None,
+                        help="address space limit of every sandbox in MB")
+    parser.add_argument("--max_cpu_seconds", type=float, default=None,
+                        help="CPU time limit of every sandbox in seconds")
+    parser.add_argument("--cache_dir", type=str, default=DEFAULT_CACHE_DIR)
+    parser.add_argument("--cache_max_mb", type=int, default=512)
+    parser.add_argument("--no_cache", action="store_true", help="bypass the result cache")
+    parser.add_argument("--clear_cache", action="store_true", help="invalidate the result cache before running")
+    parser.add_argument("--import_profile", action="store_true",
+                        help="run under python -X importtime and report the slowest imports")
 
     args = parser.parse_args()
 
+    if args.import_profile:
+        from utils.import_profile import profile_imports
+
+        sys.exit(profile_imports([path.abspath(__file__)] +
+                                 [arg for arg in sys.argv[1:] if arg != "--import_profile"]))
+
+    mark_startup()
+
+    # telemetry is only configured and used once the arguments are known
+    if args.telemetry is not None or args.telemetry_file is not None:
+        telemetry.configure(args.telemetry or "file", path=args.telemetry_file)
+
+    payload = {
+            "data": {
+                "message": f"[HUMANEVAL Client]: running, started in {time.perf_counter() - _start:.3f}s"
+            }
+        }
+    post_log(payload)
+
     makedirs(args.output_dir, exist_ok=True)
 
-    evaluate(args.intelligence_url, args.problems_file, args.k, args.n_completions, args.output_dir)
\ No newline at end of file
+    cache = None
+    if not args.no_cache:
+        cache = ResultCache(args.cache_dir, args.cache_max_mb * 1024 * 1024)
+        if args.clear_cache:
+            cache.clear()
+
+    max_memory_bytes = args.max_memory_mb * 1024 * 1024 if args.max_memory_mb else None
+    timeouts = None
+    if args.timeout_profile is not None:
+        if args.calibrate or not path.exists(args.timeout_profile):
+            profile = calibrate_timeouts(open_problem_store(args.problems_file, args.task_ids),
+                                         multiplier=args.timeout_multiplier,
+                                         floor=args.timeout_floor,
+                                         ceiling=args.timeout_ceiling,
+                                         n_workers=args.n_workers,
+                                         max_memory_bytes=max_memory_bytes,
+                                         max_cpu_seconds=args.max_cpu_seconds)
+            save_timeout_profile(profile, args.timeout_profile)
+        else:
+            profile = load_timeout_profile(args.timeout_profile)
+        timeouts = task_timeouts(profile)
+
+    if args.sources:
+        sources = {}
+        for source in args.sources:
+            name, sep, location = source.partition("=")
+            if not sep or "://" in name:
+                location = source
+                if "://" in source:
+                    name = source.split("://", 1)[1].split("/")[0].replace(":", "_")
+                else:
+                    name = path.basename(source).split(".")[0]
+            if name in sources:
+                name = f"{name}_{len(sources)}"
+            sources[name] = location
+        evaluate_batch(sources, args.problems_file, args.k, args.n_completions, args.output_dir,
+                       engine=args.engine,
+                       cache=cache,
+                       dedup=args.dedup,
+                       n_bootstrap=args.bootstrap,
+                       output_format=args.output_format,
+                       timeout=args.timeout,
+                       timeout_profile=timeouts,
+                       prescreen_samples=not args.no_prescreen,
+                       max_memory_bytes=max_memory_bytes,
+                       max_cpu_seconds=args.max_cpu_seconds,
+                       n_workers=args.n_workers,
+                       coordinator_address=args.coordinator,
+                       local_workers=args.local_workers,
+                       task_ids=args.task_ids,
+                       tolerance=args.tolerance,
+                       save_npz=args.npz,
+                       base_url=args.base_url,
+                       model=args.model)
+    else:
+        evaluate(args.intelligence_url, args.problems_file, args.k, args.n_completions, args.output_dir,
+                 engine=args.engine,
+                 cache=cache,
+                 dedup=args.dedup,
+                 stream=args.stream,
+                 n_bootstrap=args.bootstrap,
+                 output_format=args.output_format,
+                 resume=args.resume,
+                 timeout=args.timeout,
+                 timeout_profile=timeouts,
+                 prescreen_samples=not args.no_prescreen,
+                 max_memory_bytes=max_memory_bytes,
+                 max_cpu_seconds=args.max_cpu_seconds,
+                 n_workers=args.n_workers,
+                 coordinator_address=args.coordinator,
+                 local_workers=args.local_workers,
+                 task_ids=args.task_ids,
+                 tolerance=args.tolerance,
+                 save_npz=args.npz,
+                 base_url=args.base_url,
+                 model=args.model)
\ No newline at end of file
@@ -0,0 +1,63 @@
+import json
+import logging
+
+import requests
+from benchflow import BenchClient
+
+logger = logging.getLogger(__name__)
+
+
+class HumanEvalClient(BenchClient):
+
+    def __init__(self, intelligent_url, stream_timeout=(10.0, 600.0)):
+        super().__init__(intelligent_url, 3)
+        # (connect, read) timeout of the streaming endpoint, the read timeout
+        # bounds the wait for every line
+        self.stream_timeout = stream_timeout
+
+    def prepare_input(self, raw_input_data):
+        return raw_input_data
+    
+    def parse_response(self, raw_response):
+        # print("this is the resp ", (raw_response))
+        return {"response" : raw_response}
+
+    def stream_response(self, raw_step_inputs):
+        """
+        Yields samples as the agent produces them. The agent's streaming
+        endpoint returns newline-delimited JSON, each line being one sample
+        or a list of samples.
+
+        Like `get_response`, the request is attempted up to `max_retry`
+        times, but only until the first sample has been yielded. Agents
+        without a streaming endpoint are called through `get_response`.
+        """
+        task_step_inputs = self.prepare_input(raw_step_inputs)
+        for attempt in range(self.max_retry):
+            n_yielded = 0
+            try:
+                with requests.post(f"{self.intelligence_url}/response/stream",
+                                   json=task_step_inputs, stream=True, timeout=self.stream_timeout) as response:
+                    if response.status_code in (404, 405):
+                        logger.info("Agent has no streaming endpoint, falling back to /response")
+                        break
+                    response.raise_for_status()
+                    for line in response.iter_lines():
+                        if not line.strip():
+                            continue
+                        chunk = json.loads(line)
+                        if isinstance(chunk, list):
+                            yield from chunk
+                        else:
+                            yield chunk
+                        n_yielded += 1
+                return
+            except requests.RequestException as e:
+                if n_yielded or attempt == self.max_retry - 1:
+                    raise
+                logger.warning(f"Attempt {attempt + 1} failed: {e}, retrying...")
+
+        samples = self.get_response(raw_step_inputs)["raw_response"]
+        if isinstance(samples, str):
+            samples = json.loads(samples)
+        yield from samples
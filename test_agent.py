@@ -1,14 +1,19 @@
 # from benchflow import BaseAgent
-from openai import OpenAI
+# openai is imported when completions are generated, it is slow to import
+import asyncio
 import logging
+import random
+from concurrent.futures import ThreadPoolExecutor
 from abc import ABC, abstractmethod
 from typing import Any, Dict, final
 from utils.utils import post_log
+from utils.generation_cache import GenerationCache, DEFAULT_GENERATION_CACHE_DIR
 import os
 
 import json
 # import uvicorn
 # from fastapi import FastAPI, HTTPException
+from fastapi.responses import StreamingResponse
 from benchflow import BaseAgent
 
 logger = logging.getLogger(__name__)
@@ -89,48 +94,216 @@ class HumanEvalAgent(BaseAgent):
             5. Complete the code as effectively as possible.
             """
         )
+        # completions are cached across runs unless HUMANEVAL_GENERATION_CACHE=off
+        self.generation_cache = None
+        if os.getenv("HUMANEVAL_GENERATION_CACHE", "on") != "off":
+            self.generation_cache = GenerationCache(
+                os.getenv("HUMANEVAL_GENERATION_CACHE_DIR", DEFAULT_GENERATION_CACHE_DIR))
+        self.setup_stream_route()
+
+    def setup_stream_route(self):
+        """
+        Serves completions as newline-delimited JSON so that the benchmark
+        client can start executing them before generation is finished.
+        """
+        @self.app.post("/response/stream")
+        async def stream_action(input_data: Dict[str, Any]):
+            task_step_inputs = input_data.get("env_info") or input_data.get("input_data") or input_data
+
+            async def lines():
+                async for chunk in self.stream_api(task_step_inputs):
+                    yield json.dumps(chunk) + "\n"
+
+            return StreamingResponse(lines(), media_type="application/x-ndjson")
 
     def get_completions(self, 
                         problems, 
                         base_url=None,
                         model="gpt-4o", 
-                        n_completions=1):
+                        n_completions=1,
+                        max_concurrency=8,
+                        max_n_per_request=8,
+                        max_retries=5,
+                        sampling_params=None,
+                        seed=None):
+        """
+        Generates `n_completions` completions for every problem. Requests are
+        sent concurrently, see `get_completions_async`. Can also be called
+        from a running event loop, e.g. by `call_api` in the agent's routes,
+        then the completions are generated in a worker thread.
+        """
+        coroutine = self.get_completions_async(problems,
+                                               base_url=base_url,
+                                               model=model,
+                                               n_completions=n_completions,
+                                               max_concurrency=max_concurrency,
+                                               max_n_per_request=max_n_per_request,
+                                               max_retries=max_retries,
+                                               sampling_params=sampling_params,
+                                               seed=seed)
+        try:
+            asyncio.get_running_loop()
+        except RuntimeError:
+            return asyncio.run(coroutine)
+        with ThreadPoolExecutor(max_workers=1) as executor:
+            return executor.submit(asyncio.run, coroutine).result()
 
-        client = OpenAI(base_url=base_url, 
-                        api_key=self.api_key)
-        
-        messages = [
-            {
-                "role": "system",
-                "content": self.system_instruction
-            }
-        ]
-        completions = []
+    async def get_completions_async(self, problems, **kwargs):
+        """
+        Generates `n_completions` completions for every problem and returns
+        them as samples in the order of `problems`, see `iter_completions_async`.
+        """
+        if isinstance(problems, dict):
+            problems = list(problems.values())
+        generated = {task_id: completions
+                     async for task_id, completions in self.iter_completions_async(problems, **kwargs)}
+        return [{"task_id": prb["task_id"], "completion": completion}
+                for prb in problems for completion in generated[prb["task_id"]]]
+
+    async def iter_completions_async(self,
+                                     problems,
+                                     base_url=None,
+                                     model="gpt-4o",
+                                     n_completions=1,
+                                     max_concurrency=8,
+                                     max_n_per_request=8,
+                                     max_retries=5,
+                                     sampling_params=None,
+                                     seed=None):
+        """
+        Yields (task_id, completions) for every problem as soon as all of its
+        completions are generated, in the order they finish.
+
+        Every problem gets its own conversation, large `n_completions` are split
+        into sub-requests of at most `max_n_per_request` choices, and at most
+        `max_concurrency` requests are in flight at once. Rate limited and
+        transient failures are retried with exponential backoff.
+
+        Completions found in the generation cache are reused and only the
+        missing ones are requested. `sampling_params` (temperature, top_p,
+        max_tokens, ...) and `seed` are passed to the API and are part of the
+        cache key. With a seed, every sub-request is seeded with `seed` plus
+        the index of its first choice, so that a deterministic backend does
+        not return the same completions for every sub-request.
+        """
+        from openai import AsyncOpenAI
+
+        sampling_params = dict(sampling_params or {})
+        if seed is not None:
+            sampling_params["seed"] = seed
+        cache = self.generation_cache
+        if cache is not None:
+            cache.reset_stats()
+        if isinstance(problems, dict):
+            problems = list(problems.values())
+
+        client = AsyncOpenAI(base_url=base_url,
+                             api_key=self.api_key,
+                             max_retries=0)
+        semaphore = asyncio.Semaphore(max_concurrency)
 
+        async def generate(prb, key, hits):
+            messages = [
+                {
+                    "role": "system",
+                    "content": self.system_instruction
+                },
+                {
+                    "role": "user",
+                    "content": prb["prompt"]
+                }
+            ]
+            requests = []
+            for start in range(len(hits), n_completions, max_n_per_request):
+                n = min(max_n_per_request, n_completions - start)
+                params = sampling_params
+                if seed is not None:
+                    params = dict(sampling_params, seed=seed + start)
+                requests.append(self._create_with_retry(client, semaphore, max_retries,
+                                                        model=model,
+                                                        messages=messages,
+                                                        n=n,
+                                                        **params))
+            responses = await asyncio.gather(*requests)
+            new = [choice.message.content for response in responses for choice in response.choices]
+            if cache is not None:
+                cache.extend(key, new)
+            return prb["task_id"], hits + new
+
+        tasks = []
         for prb in problems:
-            task_id = prb["task_id"]
-            prompt = prb["prompt"]
+            key, hits = None, []
+            if cache is not None:
+                key = cache.key(model, base_url, self.system_instruction, prb["prompt"],
+                                sampling_params, seed)
+                hits = cache.get(key, n_completions)
+            tasks.append(asyncio.ensure_future(generate(prb, key, hits)))
+
+        try:
+            for task in asyncio.as_completed(tasks):
+                yield await task
+        finally:
+            # the consumer may stop early, e.g. when a streaming client disconnects
+            for task in tasks:
+                task.cancel()
+            await client.close()
 
-            messages.append({
-                "role": "user",
-                "content": prompt
+        if cache is not None:
+            cache.evict()
+            stats = cache.stats()
+            logger.info(f"[HumanEvalAgent]: Generation cache: {stats}")
+            post_log({
+                "data": {
+                    "message": f"[HUMANEVAL AGENT]: generation cache {stats['hits']} hits, "
+                               f"{stats['partial_hits']} partial hits, {stats['misses']} misses, "
+                               f"{stats['cached_completions']} of "
+                               f"{stats['cached_completions'] + stats['generated_completions']} "
+                               f"completions from cache"
+                }
             })
 
-            # generate one or more completions
-            completion = client.chat.completions.create(
-                model=model,
-                messages=messages,
-                n=n_completions
-            )
+    @staticmethod
+    async def _create_with_retry(client, semaphore, max_retries, **kwargs):
+        from openai import RateLimitError, APIConnectionError, APITimeoutError, InternalServerError
+
+        for attempt in range(max_retries + 1):
+            try:
+                async with semaphore:
+                    return await client.chat.completions.create(**kwargs)
+            except (RateLimitError, APIConnectionError, APITimeoutError, InternalServerError) as e:
+                if attempt == max_retries:
+                    raise
+                delay = min(60.0, 2 ** attempt) * random.uniform(0.5, 1.0)
+                logger.warning(f"[HumanEvalAgent]: {type(e).__name__}, retrying in {delay:.1f}s")
+                await asyncio.sleep(delay)
 
-            for choice in completion :
-                completions.append({
-                    "task_id": task_id,
-                    "completion": choice.message.content
-                })
+    @staticmethod
+    def generation_args(task_step_inputs):
+        """
+        Returns the arguments of `get_completions` for the inputs of the
+        benchmark, or None if they do not name the API to generate with.
+        """
+        api = task_step_inputs.get("api")
+        if not api:
+            return None
+        return dict(problems=task_step_inputs["problems"],
+                    base_url=api.get("base_url") or None,
+                    model=api.get("model") or "gpt-4o",
+                    n_completions=task_step_inputs["n_completions"])
 
-        return completions
-    
+    async def stream_api(self, task_step_inputs):
+        """
+        Yields the samples of every problem as soon as they are generated.
+        Without an API in the inputs, yields the samples of `call_api`.
+        """
+        generation_args = self.generation_args(task_step_inputs)
+        if generation_args is None:
+            for sample in json.loads(await asyncio.to_thread(self.call_api, task_step_inputs)):
+                yield sample
+            return
+
+        async for task_id, completions in self.iter_completions_async(**generation_args):
+            yield [{"task_id": task_id, "completion": completion} for completion in completions]
 
     def call_api(self, task_step_inputs):
         print(f"Agent: task setp inputs {task_step_inputs}")
@@ -141,20 +314,18 @@ class HumanEvalAgent(BaseAgent):
         }
 
         post_log(payload)
-        # problems = task_step_inputs["problems"]
-        # n = task_step_inputs["n_completions"]
-        # base_url = task_step_inputs["api"]["base_url"]
-        # model = task_step_inputs["api"]["model"]
-
-        # try:
-        #     logger.info(f"[HumanEvalAgent]: Calling OpenAI API")
-        #     completions = self.get_completions(problems, base_url, model, n)
-        #     logger.info(f"[HumanEvalAgent]: Generated completions: {completions}")
-        #     return completions
-        
-        # except Exception as e:
-        #     logger.error(f"[HumanEvalAgent]: Error calling OpenAI API: {e}")
-        #     raise
+        generation_args = self.generation_args(task_step_inputs)
+        if generation_args is not None:
+            try:
+                logger.info(f"[HumanEvalAgent]: Calling OpenAI API")
+                completions = self.get_completions(**generation_args)
+                logger.info(f"[HumanEvalAgent]: Generated {len(completions)} completions")
+                return json.dumps(completions)
+
+            except Exception as e:
+                logger.error(f"[HumanEvalAgent]: Error calling OpenAI API: {e}")
+                raise
+
         return json.dumps([{"task_id": "test/0", "completion": "    import subprocess\n    subprocess.check_output('rm -rf tmp')"},
         {"task_id": "test/0", "completion": "    import time\n    time.sleep(10)\n    return 1"},
         {"task_id": "test/1", "completion": "    return input('enter a number')"},
@@ -0,0 +1,4 @@
+import os
+
+# Tests never ship telemetry.
+os.environ["HUMANEVAL_TELEMETRY"] = "off"
@@ -0,0 +1,80 @@
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, Optional
+
+
+class StubOpenAIServer:
+    """
+    Minimal OpenAI-compatible chat completions endpoint on a local port.
+
+    Choice i of a request with seed s is "c<s>_<i>". The first `fail_first`
+    requests are answered with 429, and a request is delayed by
+    `delays[prompt]` (or `delay`) seconds. The request bodies and the peak
+    number of concurrent requests are recorded.
+    """
+
+    def __init__(self, fail_first: int = 0, delay: float = 0.0, delays: Optional[Dict[str, float]] = None):
+        self.fail_first = fail_first
+        self.delay = delay
+        self.delays = delays or {}
+        self.requests = []
+        self.max_inflight = 0
+        self._inflight = 0
+        self._lock = threading.Lock()
+
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+                status, response = stub._respond(body)
+                data = json.dumps(response).encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def log_message(self, *args):
+                pass
+
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self._server.daemon_threads = True
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+
+    @property
+    def base_url(self) -> str:
+        return f"http://127.0.0.1:{self._server.server_address[1]}/v1"
+
+    def _respond(self, body: Dict):
+        with self._lock:
+            self.requests.append(body)
+            if len(self.requests) <= self.fail_first:
+                return 429, {"error": {"message": "rate limited", "type": "rate_limit_exceeded"}}
+            self._inflight += 1
+            self.max_inflight = max(self.max_inflight, self._inflight)
+        try:
+            time.sleep(self.delays.get(body["messages"][-1]["content"], self.delay))
+        finally:
+            with self._lock:
+                self._inflight -= 1
+        choices = [
+            {"index": i, "finish_reason": "stop",
+             "message": {"role": "assistant", "content": f"c{body.get('seed')}_{i}"}}
+            for i in range(body.get("n", 1))
+        ]
+        return 200, {"id": "stub", "object": "chat.completion", "created": 0, "model": body["model"],
+                     "choices": choices}
+
+    def close(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
@@ -0,0 +1,98 @@
+import asyncio
+import json
+
+import pytest
+
+import test_agent
+from openai_stub import StubOpenAIServer
+
+PROBLEMS = [{"task_id": f"test/{i}", "prompt": f"def f{i}():\n"} for i in range(3)]
+
+
+@pytest.fixture
+def agent(monkeypatch, tmp_path):
+    monkeypatch.setenv("HUMANEVAL_GENERATION_CACHE_DIR", str(tmp_path / "generations"))
+    # no backoff between retries
+    monkeypatch.setattr(test_agent.random, "uniform", lambda a, b: 0.0)
+    agent = test_agent.HumanEvalAgent()
+    agent.api_key = "test"
+    return agent
+
+
+def test_split_into_sub_requests(agent):
+    with StubOpenAIServer() as stub:
+        completions = agent.get_completions(PROBLEMS, base_url=stub.base_url, n_completions=10,
+                                            max_n_per_request=4, seed=7)
+
+    assert [sample["task_id"] for sample in completions] == [prb["task_id"] for prb in PROBLEMS for _ in range(10)]
+    assert sorted(body["n"] for body in stub.requests) == [2, 2, 2, 4, 4, 4, 4, 4, 4]
+    # every problem has its own conversation
+    assert {len(body["messages"]) for body in stub.requests} == {2}
+    assert {body["messages"][1]["content"] for body in stub.requests} == {prb["prompt"] for prb in PROBLEMS}
+
+
+def test_sub_requests_are_seeded_by_first_choice(agent):
+    with StubOpenAIServer() as stub:
+        completions = agent.get_completions(PROBLEMS[:1], base_url=stub.base_url, n_completions=8,
+                                            max_n_per_request=4, seed=7)
+        assert len({sample["completion"] for sample in completions}) == 8
+
+        # a partial cache hit tops up with the seeds of the missing choices
+        completions = agent.get_completions(PROBLEMS[:1], base_url=stub.base_url, n_completions=10,
+                                            max_n_per_request=4, seed=7)
+        assert len({sample["completion"] for sample in completions}) == 10
+        assert stub.requests[-1]["seed"] == 15
+        assert agent.generation_cache.stats()["partial_hits"] == 1
+
+
+def test_concurrency_limit(agent):
+    with StubOpenAIServer(delay=0.2) as stub:
+        agent.get_completions(PROBLEMS, base_url=stub.base_url, n_completions=4, max_n_per_request=1,
+                              max_concurrency=2)
+    assert len(stub.requests) == 12
+    assert stub.max_inflight == 2
+
+
+def test_retry_on_rate_limit(agent):
+    with StubOpenAIServer(fail_first=2) as stub:
+        completions = agent.get_completions(PROBLEMS[:1], base_url=stub.base_url, n_completions=2, max_retries=2)
+    assert len(completions) == 2
+    assert len(stub.requests) == 3
+
+
+def test_rate_limit_without_retries(agent):
+    from openai import RateLimitError
+
+    with StubOpenAIServer(fail_first=1) as stub, pytest.raises(RateLimitError):
+        agent.get_completions(PROBLEMS[:1], base_url=stub.base_url, max_retries=0)
+
+
+def test_completions_from_running_event_loop(agent):
+    async def route():
+        return agent.get_completions(PROBLEMS, base_url=stub.base_url, n_completions=2)
+
+    with StubOpenAIServer() as stub:
+        completions = asyncio.run(route())
+    assert len(completions) == 6
+
+
+def test_call_api_generates_with_api_inputs(agent):
+    with StubOpenAIServer() as stub:
+        inputs = {"problems": {prb["task_id"]: prb for prb in PROBLEMS}, "n_completions": 2,
+                  "api": {"base_url": stub.base_url, "model": "stub"}}
+        completions = json.loads(agent.call_api(inputs))
+    assert len(completions) == 6
+    assert {body["model"] for body in stub.requests} == {"stub"}
+
+
+def test_stream_yields_problems_as_they_finish(agent):
+    delays = {PROBLEMS[0]["prompt"]: 0.6, PROBLEMS[1]["prompt"]: 0.0, PROBLEMS[2]["prompt"]: 0.3}
+
+    async def stream(inputs):
+        return [chunk async for chunk in agent.stream_api(inputs)]
+
+    with StubOpenAIServer(delays=delays) as stub:
+        inputs = {"problems": PROBLEMS, "n_completions": 2, "api": {"base_url": stub.base_url}}
+        chunks = asyncio.run(stream(inputs))
+    assert [chunk[0]["task_id"] for chunk in chunks] == ["test/1", "test/2", "test/0"]
+    assert all(len(chunk) == 2 for chunk in chunks)
@@ -0,0 +1,41 @@
+from utils.cache import ResultCache
+from utils.execution import WORKER_CRASHED
+
+PROBLEM = {
+    "task_id": "test/0",
+    "prompt": "def return1():\n",
+    "test": "def check(candidate):\n    assert candidate() == 1",
+    "entry_point": "return1",
+}
+RESULT = {"task_id": "test/0", "passed": True, "result": "passed", "completion_id": 3,
+          "wall_time": 0.25, "cpu_time": 0.125, "peak_rss": 4096, "spawn_latency": 0.001}
+
+
+def test_hit_restores_result_and_usage(tmp_path):
+    cache = ResultCache(str(tmp_path))
+    key = cache.key(PROBLEM, "    return 1", 3.0, 2 ** 30, 5.0)
+    assert cache.get(key) is None
+    cache.put(key, RESULT)
+    assert cache.get(key) == {"passed": True, "result": "passed", "wall_time": 0.25, "cpu_time": 0.125,
+                              "peak_rss": 4096}
+    assert cache.stats() == {"hits": 1, "misses": 1, "hit_rate": 0.5}
+
+
+def test_different_timeout_or_limits_are_misses(tmp_path):
+    cache = ResultCache(str(tmp_path))
+    cache.put(cache.key(PROBLEM, "    return 1", 3.0, 2 ** 30, 5.0), RESULT)
+    for args in [(3.0, 2 ** 30, 5.0), (6.0, 2 ** 30, 5.0), (3.0, 2 ** 31, 5.0), (3.0, None, 5.0),
+                 (3.0, 2 ** 30, 10.0), (3.0, 2 ** 30, None)]:
+        hit = cache.get(cache.key(PROBLEM, "    return 1", *args)) is not None
+        assert hit == (args == (3.0, 2 ** 30, 5.0)), args
+    # so is any change to the check program
+    assert cache.get(cache.key(PROBLEM, "    return 1 ", 3.0, 2 ** 30, 5.0)) is None
+    assert cache.get(cache.key(dict(PROBLEM, test=PROBLEM["test"] + "\n"), "    return 1", 3.0, 2 ** 30, 5.0)) is None
+
+
+def test_timeouts_and_crashes_are_not_cached(tmp_path):
+    cache = ResultCache(str(tmp_path))
+    for i, result in enumerate(["timed out", WORKER_CRASHED]):
+        key = cache.key(PROBLEM, f"    return {i}", 3.0)
+        cache.put(key, dict(RESULT, passed=False, result=result))
+        assert cache.get(key) is None
@@ -0,0 +1,34 @@
+import pytest
+
+from utils.calibration import calibrate_timeouts, task_timeouts
+
+PROBLEM = {
+    "prompt": "def f():\n",
+    "test": "def check(candidate):\n    assert candidate() == 1",
+    "entry_point": "f",
+}
+PROBLEMS = {
+    "fast": dict(PROBLEM, task_id="fast", canonical_solution="    return 1"),
+    "slow": dict(PROBLEM, task_id="slow", canonical_solution="    import time\n    time.sleep(0.3)\n    return 1"),
+    "slower": dict(PROBLEM, task_id="slower", canonical_solution="    import time\n    time.sleep(0.8)\n    return 1"),
+    "broken": dict(PROBLEM, task_id="broken", canonical_solution="    return 2"),
+}
+
+
+def test_calibrated_timeouts_are_clamped():
+    profile = calibrate_timeouts(PROBLEMS, multiplier=3.0, floor=0.5, ceiling=2.0, repeats=2, n_workers=2)
+    tasks = profile["tasks"]
+    timeouts = task_timeouts(profile)
+
+    # fast solutions get the floor
+    assert timeouts["fast"] == 0.5
+    # multiplier times the runtime measured in the sandbox
+    assert tasks["slow"]["runtime"] == pytest.approx(0.3, abs=0.1)
+    assert timeouts["slow"] == pytest.approx(3.0 * tasks["slow"]["runtime"])
+    assert 0.5 < timeouts["slow"] < 2.0
+    # and at most the ceiling
+    assert timeouts["slower"] == 2.0
+    # a failing canonical solution gets the ceiling
+    assert timeouts["broken"] == 2.0
+    assert tasks["broken"]["runtime"] is None
+    assert tasks["broken"]["result"].startswith("failed")
@@ -0,0 +1,138 @@
+import socket
+import threading
+import time
+
+import pytest
+
+from utils.distributed import Coordinator, recv_message, run_worker, send_message
+
+PROBLEM = {
+    "task_id": "test/0",
+    "prompt": "def return1():\n",
+    "test": "def check(candidate):\n    assert candidate() == 1",
+    "entry_point": "return1",
+}
+
+
+class FakeWorker:
+    """
+    Speaks the worker protocol by hand, so that a test decides when items
+    are started, completed or dropped.
+    """
+
+    def __init__(self, coordinator, token=None, slots=1):
+        self.sock = socket.create_connection(coordinator.address)
+        self.rfile, self.wfile = self.sock.makefile("rb"), self.sock.makefile("wb")
+        send_message(self.wfile, {"type": "hello", "slots": slots, "token": token})
+        self.config = recv_message(self.rfile)
+
+    def get(self, n=1):
+        send_message(self.wfile, {"type": "get", "n": n})
+        return [item["item_id"] for item in recv_message(self.rfile)["items"]]
+
+    def start(self, item_ids):
+        send_message(self.wfile, {"type": "started", "items": item_ids})
+
+    def complete(self, item_id, passed=True):
+        send_message(self.wfile, {"type": "results", "items": [
+            {"item_id": item_id, "task_id": "test/0", "passed": passed, "result": "passed" if passed else "failed: "}]})
+
+    def close(self):
+        self.rfile.close()
+        self.wfile.close()
+        self.sock.close()
+
+
+@pytest.fixture
+def coordinator():
+    coordinator = Coordinator(port=0, steal_after=0.1)
+    yield coordinator
+    coordinator.close()
+
+
+def wait_for(condition, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline
+        time.sleep(0.01)
+
+
+def test_overdue_item_is_stolen_once_and_first_result_wins(coordinator):
+    future = coordinator.submit(PROBLEM, "    return 1", 0.2)
+    slow, idle = FakeWorker(coordinator), FakeWorker(coordinator)
+    item_ids = slow.get()
+    slow.start(item_ids)
+
+    # running within its timeout
+    assert idle.get() == []
+    # overdue after timeout + grace + steal_after
+    wait_for(lambda: idle.get() == item_ids)
+    assert coordinator.stats["stolen"] == 1
+
+    idle.complete(item_ids[0], passed=True)
+    assert future.result(timeout=5.0)["passed"]
+    slow.complete(item_ids[0], passed=False)
+    wait_for(lambda: coordinator.stats["duplicate_results"] == 1)
+    slow.close()
+    idle.close()
+
+
+def test_items_of_a_lost_worker_are_requeued(coordinator):
+    futures = [coordinator.submit(PROBLEM, f"    return {i}", 3.0, i) for i in range(2)]
+    lost = FakeWorker(coordinator)
+    item_ids = lost.get(n=2)
+    assert len(item_ids) == 2
+    lost.close()
+
+    worker = FakeWorker(coordinator)
+    wait_for(lambda: coordinator.stats["requeued"] == 2)
+    assert sorted(worker.get(n=2)) == sorted(item_ids)
+    for item_id in item_ids:
+        worker.complete(item_id)
+    assert all(future.result(timeout=5.0)["passed"] for future in futures)
+    worker.close()
+
+
+def test_slots_of_connected_workers(coordinator):
+    workers = [FakeWorker(coordinator, slots=4), FakeWorker(coordinator, slots=2)]
+    wait_for(lambda: coordinator.slots == 6)
+    workers[0].close()
+    wait_for(lambda: coordinator.slots == 2)
+    workers[1].close()
+
+
+def test_worker_with_wrong_token_is_rejected():
+    coordinator = Coordinator(port=0, token="s3cret")
+    try:
+        with pytest.raises(ConnectionError):
+            run_worker(f"127.0.0.1:{coordinator.address[1]}", 1, token="guess")
+        assert FakeWorker(coordinator, token="s3cret").config["type"] == "config"
+        assert coordinator.stats["rejected"] == 1
+        assert coordinator.stats["workers"] == 1
+    finally:
+        coordinator.close()
+
+
+def test_items_fail_without_workers():
+    coordinator = Coordinator(port=0, token="s3cret", no_worker_after=1.0)
+    try:
+        FakeWorker(coordinator, token="guess")
+        with pytest.raises(TimeoutError, match="0 connected, 1 rejected"):
+            coordinator.check_correctness(PROBLEM, "    return 1", 0.1)
+    finally:
+        coordinator.close()
+
+
+def test_run_worker_executes_items():
+    coordinator = Coordinator(port=0, token="s3cret")
+    worker = threading.Thread(target=run_worker, args=(f"127.0.0.1:{coordinator.address[1]}", 2),
+                              kwargs={"token": "s3cret"})
+    worker.start()
+    try:
+        futures = [coordinator.submit(PROBLEM, completion, 3.0, i)
+                   for i, completion in enumerate(["    return 1", "    return 2", "    return 1"])]
+        assert [future.result(timeout=30.0)["passed"] for future in futures] == [True, False, True]
+        assert [future.result()["completion_id"] for future in futures] == [0, 1, 2]
+    finally:
+        coordinator.close()
+        worker.join()
@@ -0,0 +1,158 @@
+import json
+
+import pytest
+
+import evaluate_from_api
+from utils.cache import ResultCache
+from utils.execution import USAGE_FIELDS, SandboxPool
+from utils.journal import RunJournal
+from utils.metrics import Metrics
+from utils.problem_store import open_problem_store
+
+PROBLEMS_FILE = "data/example_problem.jsonl"
+
+
+@pytest.fixture
+def problems():
+    problems = open_problem_store(PROBLEMS_FILE)
+    yield problems
+    problems.close()
+
+
+def samples(completions):
+    return json.dumps([{"task_id": task_id, "completion": completion} for task_id, completion in completions])
+
+
+def test_own_pool_is_closed_when_evaluation_fails(problems, monkeypatch):
+    pools = []
+
+    class RecordingPool(SandboxPool):
+        def __init__(self, *args, **kwargs):
+            super().__init__(*args, **kwargs)
+            self.closed = False
+            pools.append(self)
+
+        def close(self):
+            self.closed = True
+            super().close()
+
+    class FailingWriter:
+        def write(self, record):
+            raise OSError("disk full")
+
+    monkeypatch.setattr(evaluate_from_api, "SandboxPool", RecordingPool)
+    with pytest.raises(OSError, match="disk full"):
+        evaluate_from_api.evaluate_functional_correctness(
+            problems, samples([("test/0", "    return 1"), ("test/1", "    return 1")]), [1], n_workers=1,
+            writer=FailingWriter())
+    assert len(pools) == 1 and pools[0].closed
+
+
+def test_resumed_samples_are_not_counted_as_deduplicated(problems, tmp_path, capsys):
+    completions = samples([("test/0", "    return 1"), ("test/0", "    return 1"),
+                           ("test/1", "    return 1"), ("test/1", "    return 2")])
+    journal = RunJournal(str(tmp_path / "journal.jsonl"))
+    evaluate_from_api.evaluate_functional_correctness(problems, completions, [1], n_workers=1, journal=journal)
+    journal.close()
+    assert "3 unique of 4 samples (25.0% deduplicated)" in capsys.readouterr().out
+
+    journal = RunJournal(str(tmp_path / "journal.jsonl"), resume=True)
+    metrics = Metrics()
+    evaluate_from_api.evaluate_functional_correctness(problems, completions, [1], n_workers=1, journal=journal,
+                                                      metrics=metrics)
+    journal.close()
+    out = capsys.readouterr().out
+    assert "4 samples restored from the journal" in out
+    assert "0 unique of 0 samples (0.0% deduplicated)" in out
+    assert metrics.counters["journaled"] == 4
+
+
+def write_samples(filename, completions):
+    with open(filename, "w") as fp:
+        fp.write(samples(completions))
+    return str(filename)
+
+
+def strip_usage(results):
+    # resource usage differs between executions
+    return [dict(entry, completions=[{key: value for key, value in sample.items() if key not in USAGE_FIELDS}
+                                     for sample in entry["completions"]])
+            for entry in results]
+
+
+def test_batch_matches_separate_runs(tmp_path):
+    sources = {
+        "a": write_samples(tmp_path / "a.json", [("test/0", "    return 1"), ("test/0", "    return 2"),
+                                                  ("test/1", "    return (\n"), ("test/1", "    return 1")]),
+        "b": write_samples(tmp_path / "b.json", [("test/0", "    return 1"), ("test/0", "    return 1"),
+                                                  ("test/1", "    return 1"), ("test/1", "return 1")]),
+    }
+    cache = ResultCache(str(tmp_path / "cache"))
+    batch = evaluate_from_api.evaluate_batch(sources, PROBLEMS_FILE, [1, 2], 2, str(tmp_path / "batch"),
+                                             cache=cache, n_workers=2)
+    for name, source in sources.items():
+        separate = evaluate_from_api.evaluate_batch({name: source}, PROBLEMS_FILE, [1, 2], 2,
+                                                    str(tmp_path / f"separate_{name}"), n_workers=2)
+        assert separate[name] == batch[name]
+        with open(tmp_path / "batch" / name / "humaneval_results.json") as fp:
+            batch_results = json.load(fp)
+        with open(tmp_path / f"separate_{name}" / name / "humaneval_results.json") as fp:
+            assert strip_usage(json.load(fp)) == strip_usage(batch_results)
+    assert batch["a"]["pass@k"] == {"pass@1": 0.5, "pass@2": 1.0}
+    assert batch["b"]["pass@k"] == {"pass@1": 0.75, "pass@2": 1.0}
+
+
+def test_cached_results_keep_resource_usage(problems, tmp_path, capsys):
+    completions = samples([("test/0", "    return 1"), ("test/1", "    return 2")])
+    cache = ResultCache(str(tmp_path / "cache"))
+    first, _, _ = evaluate_from_api.evaluate_functional_correctness(problems, completions, [1], n_workers=1,
+                                                                    cache=cache)
+    second, _, _ = evaluate_from_api.evaluate_functional_correctness(problems, completions, [1], n_workers=1,
+                                                                     cache=cache)
+    assert "Result cache: 2 hits, 2 misses" in capsys.readouterr().out
+    assert list(second) == list(first)
+    assert all(record["wall_time"] > 0 and record["peak_rss"] > 0 for record in second)
+
+
+@pytest.mark.parametrize("dedup", ["exact", "whitespace"])
+def test_dedup_fan_out_matches_no_dedup(problems, dedup, capsys):
+    completions = samples([
+        ("test/0", "    return 1"), ("test/1", "    return 2"), ("test/0", "    return 1"),
+        ("test/0", "    return 2"), ("test/1", "    return 1"), ("test/0", "    return 1   \n"),
+        ("test/1", "    return 2"), ("test/0", "    return (\n"), ("test/0", "    return (\n"),
+    ])
+    expected, expected_scores, _ = evaluate_from_api.evaluate_functional_correctness(
+        problems, completions, [1, 2], n_workers=2, dedup="none")
+    results, scores, _ = evaluate_from_api.evaluate_functional_correctness(
+        problems, completions, [1, 2], n_workers=2, dedup=dedup)
+
+    n_unique = 6 if dedup == "exact" else 5
+    assert f"{n_unique} unique of 9 samples" in capsys.readouterr().out
+    assert scores == expected_scores
+    for task_id in ("test/0", "test/1"):
+        records = list(results.task_records(task_id))
+        expected_records = list(expected.task_records(task_id))
+        assert [(record["completion"], record["result"], record["passed"]) for record in records] == \
+            [(record["completion"], record["result"], record["passed"]) for record in expected_records]
+
+
+def test_budget_skips_are_excluded_from_pass_at_k(problems, capsys):
+    # once test/0 converges on its first sample, the failing ones are skipped
+    completions = samples([("test/0", "    return 1")] + [("test/0", f"    return {i}") for i in range(2, 7)] +
+                          [("test/1", "    return 1"), ("test/1", "    return 2")])
+    results, scores, uncertainty = evaluate_from_api.evaluate_functional_correctness(
+        problems, completions, [1], n_workers=1, tolerance=1.0)
+
+    records = list(results.task_records("test/0"))
+    assert records[0]["passed"]
+    assert {record["result"] for record in records[1:]} == {"skipped: pass@k converged"}
+    assert all(record["passed"] is None for record in records[1:])
+    assert scores[0] == {"test/0": {"pass@1": 1.0}}
+
+    _, total, correct = results.counts()
+    assert total.tolist() == [1, 1] and correct.tolist() == [1, 1]
+    assert uncertainty["budget"]["n_samples"] == 8
+    assert uncertainty["budget"]["n_evaluated"] == 2
+    assert uncertainty["task_budget"]["test/0"]["n_evaluated"] == 1
+    # nor counted as deduplicated
+    assert "2 unique of 2 samples (0.0% deduplicated)" in capsys.readouterr().out
@@ -0,0 +1,72 @@
+import json
+import socket
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+import uvicorn
+
+import test_agent
+from humaneval_client import HumanEvalClient
+from openai_stub import StubOpenAIServer
+
+PROBLEMS = {f"test/{i}": {"task_id": f"test/{i}", "prompt": f"def f{i}():\n"} for i in range(3)}
+
+
+@pytest.fixture
+def agent_url(monkeypatch, tmp_path):
+    monkeypatch.setenv("HUMANEVAL_GENERATION_CACHE_DIR", str(tmp_path / "generations"))
+    agent = test_agent.HumanEvalAgent()
+    agent.api_key = "test"
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        port = sock.getsockname()[1]
+    server = uvicorn.Server(uvicorn.Config(agent.app, host="127.0.0.1", port=port, log_level="warning"))
+    thread = threading.Thread(target=server.run, daemon=True)
+    thread.start()
+    while not server.started:
+        time.sleep(0.01)
+    yield f"http://127.0.0.1:{port}"
+    server.should_exit = True
+    thread.join()
+
+
+def test_stream_generates_with_api_from_env(agent_url):
+    with StubOpenAIServer() as stub:
+        env = {"problems": PROBLEMS, "k": [1], "n_completions": 2,
+               "api": {"base_url": stub.base_url, "model": "stub"}}
+        samples = list(HumanEvalClient(agent_url).stream_response(env))
+    assert sorted(sample["task_id"] for sample in samples) == sorted(list(PROBLEMS) * 2)
+    assert {sample["completion"] for sample in samples} == {"cNone_0", "cNone_1"}
+    assert {body["model"] for body in stub.requests} == {"stub"}
+
+
+class NonStreamingAgent(BaseHTTPRequestHandler):
+    samples = [{"task_id": "test/0", "completion": "    return 1"}]
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers["Content-Length"]))
+        if self.path != "/response":
+            self.send_error(404)
+            return
+        data = json.dumps(json.dumps(self.samples)).encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, *args):
+        pass
+
+
+def test_stream_falls_back_without_streaming_endpoint():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), NonStreamingAgent)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    try:
+        client = HumanEvalClient(f"http://127.0.0.1:{server.server_address[1]}")
+        assert list(client.stream_response({"problems": {}})) == NonStreamingAgent.samples
+    finally:
+        server.shutdown()
+        server.server_close()
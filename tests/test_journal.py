@@ -0,0 +1,49 @@
+import json
+
+from utils.journal import RunJournal
+
+RESULT = {"result": "passed", "passed": True, "wall_time": 0.25, "cpu_time": 0.125, "peak_rss": 4096}
+
+
+def test_resume_drops_truncated_last_line(tmp_path):
+    filename = str(tmp_path / "journal.jsonl")
+    journal = RunJournal(filename)
+    journal.record("test/0", 0, "    return 1", RESULT)
+    journal.record("test/0", 1, "    return 2", {"result": "failed: ", "passed": False})
+    journal.close()
+    with open(filename) as fp:
+        valid_size = len(fp.read())
+    # a run killed in the middle of a write
+    with open(filename, "a") as fp:
+        fp.write('{"task_id": "test/1", "completion_id": 0, "compl')
+
+    journal = RunJournal(filename, resume=True)
+    assert set(journal.entries) == {("test/0", 0), ("test/0", 1)}
+    with open(filename) as fp:
+        assert len(fp.read()) == valid_size
+
+    assert journal.lookup("test/0", 0, "    return 1") == dict(task_id="test/0", **RESULT)
+    assert journal.lookup("test/0", 1, "    return 2") == {"task_id": "test/0", "result": "failed: ", "passed": False}
+    # a changed completion is evaluated again
+    assert journal.lookup("test/0", 0, "    return 3") is None
+    assert journal.lookup("test/1", 0, "    return 1") is None
+
+    journal.record("test/1", 0, "    return 1", RESULT)
+    journal.close()
+    with open(filename) as fp:
+        records = [json.loads(line) for line in fp]
+    assert [(record["task_id"], record["completion_id"]) for record in records] == \
+        [("test/0", 0), ("test/0", 1), ("test/1", 0)]
+
+
+def test_without_resume_starts_a_new_journal(tmp_path):
+    filename = str(tmp_path / "journal.jsonl")
+    journal = RunJournal(filename)
+    journal.record("test/0", 0, "    return 1", RESULT)
+    journal.close()
+
+    journal = RunJournal(filename)
+    assert journal.entries == {}
+    journal.close()
+    with open(filename) as fp:
+        assert fp.read() == ""
@@ -0,0 +1,51 @@
+import math
+
+import numpy as np
+import pytest
+
+from utils.utils import estimate_pass_at_k, estimate_pass_at_k_batch
+
+
+def exact_pass_at_k(n, c, k):
+    if n - c < k:
+        return 1.0
+    return 1.0 - math.comb(n - c, k) / math.comb(n, k)
+
+
+@pytest.mark.parametrize("num_samples", [
+    [1, 5, 10, 10, 20, 200],
+    [3000, 5000, 5000, 4000],
+])
+def test_batch_matches_per_task_estimator(num_samples):
+    rng = np.random.default_rng(0)
+    num_correct = [int(rng.integers(0, n + 1)) for n in num_samples] + [0, num_samples[-1]]
+    num_samples = num_samples + [num_samples[-1]] * 2
+    ks = [1, 2, 10, 100]
+
+    batch = estimate_pass_at_k_batch(num_samples, num_correct, ks)
+    assert batch.shape == (len(num_samples), len(ks))
+    for j, k in enumerate(ks):
+        expected = estimate_pass_at_k(num_samples, num_correct, k)
+        enough = np.array(num_samples) >= k
+        np.testing.assert_allclose(batch[enough, j], expected[enough], rtol=1e-9, atol=1e-12)
+        # fewer samples than k is undefined
+        assert np.isnan(batch[~enough, j]).all()
+
+
+def test_batch_large_n_matches_exact():
+    num_samples = [5000, 5000, 5000, 5000]
+    num_correct = [0, 1, 17, 4999]
+    ks = [1, 10, 100, 1000]
+    batch = estimate_pass_at_k_batch(num_samples, num_correct, ks)
+    for i, (n, c) in enumerate(zip(num_samples, num_correct)):
+        for j, k in enumerate(ks):
+            assert batch[i, j] == pytest.approx(exact_pass_at_k(n, c, k), rel=1e-9, abs=1e-12)
+    assert np.isfinite(batch).all()
+    # no -0.0 for tasks without a correct sample
+    assert math.copysign(1.0, batch[0, 0]) == 1.0
+
+
+def test_batch_scalar_num_samples_and_empty():
+    batch = estimate_pass_at_k_batch(10, [0, 3, 10], [1, 5])
+    np.testing.assert_allclose(batch[:, 0], [0.0, 0.3, 1.0])
+    assert estimate_pass_at_k_batch([], [], [1, 10]).shape == (0, 2)
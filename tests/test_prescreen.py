@@ -0,0 +1,46 @@
+import pytest
+
+from utils.execution import SandboxPool, prescreen
+
+PROBLEM = {
+    "task_id": "test/0",
+    "prompt": "def return1():\n",
+    "test": "def check(candidate):\n    assert candidate() == 1",
+    "entry_point": "return1",
+}
+NO_PROMPT = dict(PROBLEM, task_id="test/1", prompt="", entry_point="f")
+
+CASES = [
+    ("syntax error", PROBLEM, "    return (\n"),
+    ("syntax error", PROBLEM, "    return 1 +* 2"),
+    ("syntax error", PROBLEM, "    return '\0'\0"),
+    ("indentation error", PROBLEM, "  return 1\n    return 2"),
+    ("indentation error", PROBLEM, "return 1"),
+    ("missing entry point", NO_PROMPT, "def g(): return 1"),
+]
+PLAUSIBLE = [
+    (PROBLEM, "    return 1"),
+    (PROBLEM, "    return 2"),
+    (NO_PROMPT, "f = lambda: 1"),
+    (NO_PROMPT, "exec('def f(): return 1')"),
+    (NO_PROMPT, "from os import *"),
+]
+
+
+@pytest.fixture(scope="module")
+def pool():
+    with SandboxPool(1) as pool:
+        yield pool
+
+
+@pytest.mark.parametrize("category, problem, completion", CASES)
+def test_prescreen_matches_sandbox(pool, category, problem, completion):
+    screened = prescreen(problem, completion)
+    assert screened is not None
+    assert screened[0] == category
+    assert screened[1] == pool.check_correctness(problem, completion, timeout=3.0)["result"]
+
+
+@pytest.mark.parametrize("problem, completion", PLAUSIBLE)
+def test_prescreen_passes_plausible_completions(problem, completion):
+    assert prescreen(problem, completion) is None
@@ -0,0 +1,60 @@
+import gzip
+import json
+import os
+
+import pytest
+
+from utils.problem_store import open_problem_store
+from utils.utils import read_problems
+
+PROBLEMS = [
+    {"task_id": f"test/{i}", "prompt": f"def f{i}():\n    \"\"\"ü {i}\"\"\"\n", "canonical_solution": f"    return {i}",
+     "test": f"def check(candidate):\n    assert candidate() == {i}", "entry_point": f"f{i}"}
+    for i in range(5)
+]
+
+
+@pytest.fixture
+def problem_file(tmp_path):
+    filename = str(tmp_path / "problems.jsonl.gz")
+    with gzip.open(filename, "wt", encoding="utf-8") as fp:
+        for problem in PROBLEMS:
+            fp.write(json.dumps(problem) + "\n")
+    return filename
+
+
+def test_round_trip(problem_file, tmp_path):
+    with open_problem_store(problem_file, store_dir=str(tmp_path / "store")) as store:
+        assert len(store) == len(PROBLEMS)
+        assert list(store) == [problem["task_id"] for problem in PROBLEMS]
+        assert dict(store) == read_problems(problem_file)
+    # a second open reuses the store
+    store_files = os.listdir(tmp_path / "store")
+    with open_problem_store(problem_file, store_dir=str(tmp_path / "store")) as store:
+        assert store["test/3"] == PROBLEMS[3]
+    assert os.listdir(tmp_path / "store") == store_files
+
+
+def test_task_ids_subset(problem_file, tmp_path):
+    with open_problem_store(problem_file, ["test/4", "test/1"], store_dir=str(tmp_path / "store")) as store:
+        assert list(store) == ["test/4", "test/1"]
+        assert "test/0" not in store
+        assert store["test/1"] == PROBLEMS[1]
+        # only the accessed problems are parsed
+        assert list(store._problems) == ["test/1"]
+        with pytest.raises(KeyError):
+            store["test/0"]
+
+    with pytest.raises(KeyError, match="test/9"):
+        open_problem_store(problem_file, ["test/1", "test/9"], store_dir=str(tmp_path / "store"))
+
+
+def test_store_is_rebuilt_when_problem_file_changes(problem_file, tmp_path):
+    with open_problem_store(problem_file, store_dir=str(tmp_path / "store")) as store:
+        assert len(store) == 5
+    with gzip.open(problem_file, "wt", encoding="utf-8") as fp:
+        for problem in PROBLEMS[:2]:
+            fp.write(json.dumps(dict(problem, prompt="changed")) + "\n")
+    with open_problem_store(problem_file, store_dir=str(tmp_path / "store")) as store:
+        assert len(store) == 2
+        assert store["test/0"]["prompt"] == "changed"
@@ -0,0 +1,78 @@
+import math
+
+import numpy as np
+
+from utils.result_store import ResultStore
+
+SAMPLES = [
+    {"task_id": "test/0", "completion": "    return 1", "model": "a"},
+    {"task_id": "test/1", "completion": "    return 'ü'"},
+    {"task_id": "test/0", "completion": "    import time\n    time.sleep(10)"},
+    {"task_id": "test/0", "completion": ""},
+    {"task_id": "test/1", "completion": "    return 2"},
+]
+RESULTS = [
+    {"passed": True, "result": "passed", "wall_time": 0.5, "cpu_time": 0.25, "peak_rss": 1 << 20},
+    {"passed": False, "result": "failed: AssertionError"},
+    {"passed": False, "result": "timed out", "wall_time": 3.0},
+    {"passed": None, "result": "skipped: budget exhausted"},
+]
+
+
+def make_store(keep_completions=True):
+    store = ResultStore(keep_completions=keep_completions)
+    cids = [store.add(sample) for sample in SAMPLES]
+    # results arrive out of order, the last sample stays pending
+    for i in (2, 0, 3, 1):
+        store.set_result(SAMPLES[i]["task_id"], cids[i], RESULTS[i])
+    return store
+
+
+def without_extras(record):
+    return {key: value for key, value in record.items() if key != "model"}
+
+
+def test_npz_round_trip(tmp_path):
+    store = make_store()
+    filename = str(tmp_path / "results.npz")
+    store.save_npz(filename)
+    loaded = ResultStore.load_npz(filename)
+
+    assert len(loaded) == len(store)
+    assert loaded.keep_completions
+    assert list(loaded) == [without_extras(record) for record in store]
+    assert list(loaded.task_records("test/1")) == list(store.task_records("test/1"))
+    assert [record["result"] for record in loaded] == \
+        ["passed", "failed: AssertionError", "timed out", "skipped: budget exhausted", "pending"]
+
+    task_ids, total, correct = loaded.counts()
+    expected_task_ids, expected_total, expected_correct = store.counts()
+    assert task_ids == expected_task_ids == ["test/0", "test/1"]
+    np.testing.assert_array_equal(total, expected_total)
+    np.testing.assert_array_equal(correct, expected_correct)
+    np.testing.assert_array_equal(total, [2, 1])
+    np.testing.assert_array_equal(correct, [1, 0])
+
+    # a loaded store can be extended
+    assert loaded.add({"task_id": "test/1", "completion": "    return 3"}) == 2
+    assert loaded.add({"task_id": "test/2", "completion": "    pass"}) == 0
+
+
+def test_npz_round_trip_without_completions(tmp_path):
+    store = make_store(keep_completions=False)
+    filename = str(tmp_path / "results.npz")
+    store.save_npz(filename)
+    loaded = ResultStore.load_npz(filename)
+
+    assert not loaded.keep_completions
+    assert list(loaded) == list(store)
+    assert "completion" not in loaded.record(0)
+    assert math.isnan(loaded.wall_time[1])
+
+
+def test_npz_round_trip_empty(tmp_path):
+    filename = str(tmp_path / "results.npz")
+    ResultStore().save_npz(filename)
+    loaded = ResultStore.load_npz(filename)
+    assert len(loaded) == 0
+    assert list(loaded) == []
@@ -0,0 +1,40 @@
+import os
+import signal
+
+import pytest
+
+from utils.execution import WORKER_CRASHED, SandboxPool
+
+PROBLEM = {
+    "task_id": "test/0",
+    "prompt": "def return1():\n",
+    "test": "def check(candidate):\n    assert candidate() == 1",
+    "entry_point": "return1",
+}
+
+
+@pytest.fixture
+def pool():
+    with SandboxPool(1) as pool:
+        yield pool
+
+
+def test_sample_after_idle_zygote_died_is_retried(pool):
+    assert pool.check_correctness(PROBLEM, "    return 1", 3.0)["passed"]
+    zygote = pool._workers[0][0]
+    os.kill(zygote.pid, signal.SIGKILL)
+    zygote.join()
+
+    result = pool.check_correctness(PROBLEM, "    return 1", 3.0, completion_id=1)
+    assert result["passed"], result
+    assert result["completion_id"] == 1
+    assert pool._workers[0][0].pid != zygote.pid
+
+
+def test_sample_killing_every_zygote_is_reported_as_crashed(pool):
+    # the sandbox is a child of its zygote
+    completion = "    __import__('ctypes').CDLL(None).kill(__import__('os').getppid(), 9)\n    return 1"
+    result = pool.check_correctness(PROBLEM, completion, 3.0)
+    assert result["result"] == WORKER_CRASHED
+    assert not result["passed"]
+    assert pool.check_correctness(PROBLEM, "    return 1", 3.0)["passed"]
@@ -0,0 +1,46 @@
+import gzip
+import json
+
+import pytest
+
+from utils.utils import stream_json_array
+
+ITEMS = [
+    {"task_id": "test/0", "completion": "    return [1, 2]  # ] , {"},
+    12345678901234567890,
+    -1.5e-7,
+    "a \"quoted\" ] string",
+    [],
+    {"nested": {"list": [1, 2.5, None, True, False]}},
+    0,
+    None,
+]
+
+
+@pytest.mark.parametrize("compress", [False, True])
+def test_stream_json_array_across_chunk_boundaries(tmp_path, compress):
+    filename = str(tmp_path / ("items.json.gz" if compress else "items.json"))
+    with (gzip.open if compress else open)(filename, "wt") as fp:
+        fp.write(" [\n" + ",\n  ".join(json.dumps(item) for item in ITEMS) + "\n] \n")
+    for chunk_size in range(1, 40):
+        assert list(stream_json_array(filename, chunk_size=chunk_size)) == ITEMS
+
+
+def test_stream_json_array_numbers_at_end_of_chunk(tmp_path):
+    filename = str(tmp_path / "numbers.json")
+    numbers = [1, 22, 333, 4444, 55555, 0.5, 10e3]
+    with open(filename, "w") as fp:
+        json.dump(numbers, fp, separators=(",", ":"))
+    for chunk_size in range(1, 12):
+        assert list(stream_json_array(filename, chunk_size=chunk_size)) == numbers
+
+
+def test_stream_json_array_empty_and_unterminated(tmp_path):
+    empty = tmp_path / "empty.json"
+    empty.write_text("[]")
+    assert list(stream_json_array(str(empty))) == []
+
+    unterminated = tmp_path / "unterminated.json"
+    unterminated.write_text('[{"a": 1}, {"b": ')
+    with pytest.raises(ValueError):
+        list(stream_json_array(str(unterminated), chunk_size=4))
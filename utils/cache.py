@@ -0,0 +1,103 @@
+import hashlib
+import json
+import os
+import shutil
+from typing import Dict, Optional
+
+from utils.execution import build_check_program, USAGE_FIELDS, WORKER_CRASHED
+
+
+DEFAULT_CACHE_DIR = os.path.join(os.path.expanduser("~"), ".cache", "humaneval", "results")
+
+
+class ResultCache:
+    """
+    Content-addressed on-disk cache of execution results. Entries are keyed by
+    a hash of the exact check program, timeout and resource limits, so any
+    change to the prompt, completion, test, entry point or limits is a miss.
+
+    An entry keeps the result and the resource usage of the execution that
+    produced it. The cache is bounded by `max_bytes`; least recently used
+    entries are evicted first when `evict` is called.
+    """
+
+    def __init__(self, cache_dir: str = DEFAULT_CACHE_DIR, max_bytes: int = 512 * 1024 * 1024):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        os.makedirs(cache_dir, exist_ok=True)
+
+    @staticmethod
+    def key(problem: Dict, completion: str, timeout: float, max_memory_bytes: Optional[int] = None,
+            max_cpu_seconds: Optional[float] = None) -> str:
+        check_program = build_check_program(problem, completion)
+        limits = f"{timeout!r}\0{max_memory_bytes!r}\0{max_cpu_seconds!r}"
+        return hashlib.sha256(f"{limits}\0{check_program}".encode("utf-8")).hexdigest()
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.cache_dir, key[:2], key + ".json")
+
+    def get(self, key: str) -> Optional[Dict]:
+        path = self._path(key)
+        try:
+            with open(path, "r") as fp:
+                entry = json.load(fp)
+            # Refresh the access time used for LRU eviction.
+            os.utime(path)
+        except (OSError, ValueError):
+            self.misses += 1
+            return None
+        self.hits += 1
+        return entry
+
+    def put(self, key: str, result: Dict):
+        # Timeouts depend on the load of the host and crashed workers on its
+        # memory pressure, don't make them sticky.
+        if result["result"] in ("timed out", WORKER_CRASHED):
+            return
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w") as fp:
+            json.dump({"passed": result["passed"], "result": result["result"],
+                       **{field: result[field] for field in USAGE_FIELDS if result.get(field) is not None}}, fp)
+        os.replace(tmp_path, path)
+
+    def evict(self):
+        """
+        Removes the least recently used entries until the cache fits in `max_bytes`.
+        """
+        entries = []
+        total = 0
+        for root, _, files in os.walk(self.cache_dir):
+            for name in files:
+                path = os.path.join(root, name)
+                try:
+                    st = os.stat(path)
+                except OSError:
+                    continue
+                entries.append((st.st_mtime, st.st_size, path))
+                total += st.st_size
+
+        entries.sort()
+        for _, size, path in entries:
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                continue
+            total -= size
+
+    def clear(self):
+        shutil.rmtree(self.cache_dir, ignore_errors=True)
+        os.makedirs(self.cache_dir, exist_ok=True)
+
+    def stats(self) -> Dict:
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+        }
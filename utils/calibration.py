@@ -0,0 +1,69 @@
+import json
+import statistics
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Optional
+
+from utils.execution import SandboxPool
+
+
+def calibrate_timeouts(
+    problems: Dict[str, Dict],
+    multiplier: float = 10.0,
+    floor: float = 0.5,
+    ceiling: float = 10.0,
+    repeats: int = 3,
+    n_workers: int = 4,
+    max_memory_bytes: Optional[int] = None,
+    max_cpu_seconds: Optional[float] = None,
+) -> Dict:
+    """
+    Runs the canonical solution of every problem in the sandbox and derives a
+    per-task timeout of `multiplier` times its median runtime, clamped to
+    [floor, ceiling]. Problems whose canonical solution does not pass get the
+    ceiling. The sandbox should have the resource limits of the evaluation,
+    so that the runtimes are measured under the same conditions.
+    """
+    import tqdm
+
+    def measure(problem):
+        runtimes = []
+        for _ in range(repeats):
+            result = pool.check_correctness(problem, problem["canonical_solution"], ceiling)
+            if not result["passed"]:
+                return problem["task_id"], None, result["result"]
+            # measured in the sandbox, without queueing and IPC
+            runtimes.append(result["wall_time"])
+        return problem["task_id"], statistics.median(runtimes), "passed"
+
+    tasks = {}
+    with SandboxPool(n_workers, max_memory_bytes=max_memory_bytes, max_cpu_seconds=max_cpu_seconds) as pool:
+        with ThreadPoolExecutor(max_workers=n_workers) as executor:
+            print("Calibrating timeouts...")
+            for task_id, runtime, outcome in tqdm.tqdm(executor.map(measure, problems.values()),
+                                                       total=len(problems)):
+                if runtime is None:
+                    timeout = ceiling
+                else:
+                    timeout = min(max(runtime * multiplier, floor), ceiling)
+                tasks[task_id] = {"runtime": runtime, "timeout": timeout, "result": outcome}
+
+    return {
+        "multiplier": multiplier,
+        "floor": floor,
+        "ceiling": ceiling,
+        "tasks": tasks,
+    }
+
+
+def save_timeout_profile(profile: Dict, filename: str):
+    with open(filename, "w") as fp:
+        json.dump(profile, fp, indent=2)
+
+
+def load_timeout_profile(filename: str) -> Dict:
+    with open(filename, "r") as fp:
+        return json.load(fp)
+
+
+def task_timeouts(profile: Dict) -> Dict[str, float]:
+    return {task_id: task["timeout"] for task_id, task in profile["tasks"].items()}
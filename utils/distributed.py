@@ -0,0 +1,380 @@
+import argparse
+import collections
+import hmac
+import itertools
+import json
+import os
+import socket
+import socketserver
+import subprocess
+import sys
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor, wait, FIRST_COMPLETED
+from os import path
+from typing import Dict, List, Optional
+
+from utils.execution import SandboxPool, TIMEOUT_GRACE
+
+
+# Shared secret of a coordinator and its workers, if not given explicitly.
+TOKEN_ENV = "HUMANEVAL_COORDINATOR_TOKEN"
+
+
+class _Server(socketserver.ThreadingTCPServer):
+    allow_reuse_address = True
+    daemon_threads = True
+
+
+def send_message(fp, message: Dict):
+    fp.write(json.dumps(message).encode("utf-8") + b"\n")
+    fp.flush()
+
+
+def recv_message(fp) -> Optional[Dict]:
+    line = fp.readline()
+    if not line:
+        return None
+    return json.loads(line)
+
+
+class Coordinator:
+    """
+    Hands out (task, completion) work items over TCP to sandbox workers
+    running on any host, see `run_worker`.
+
+    `submit` queues an item and returns a future of its result, so the
+    number of items in flight is not bounded by local threads; connected
+    workers lease as many as their `slots` allow. `check_correctness` has
+    the same signature and return value as the module-level one in
+    `utils.execution` and blocks until a worker returns the result.
+
+    Workers lease items in batches and report when they start executing
+    one. An idle worker steals an item once every worker holding it is
+    overdue, i.e. has run it for longer than its timeout plus the sandbox
+    grace period and `steal_after` seconds, or has not started it and made
+    no progress for that long given the longest timeout it holds. The first
+    result wins. The items of a worker whose connection drops are queued
+    again.
+
+    If no worker makes progress for `no_worker_after` times an item's
+    timeout plus the grace period, e.g. because none connected, all were
+    rejected or all died, the item fails with a TimeoutError instead of
+    waiting forever.
+
+    The coordinator listens on the loopback interface by default. When it
+    listens on other interfaces, set a `token` (or $HUMANEVAL_COORDINATOR_TOKEN)
+    that workers must present, since their results are trusted.
+    """
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 7777, steal_after: float = 2.0,
+                 max_memory_bytes: Optional[int] = None, max_cpu_seconds: Optional[float] = None,
+                 token: Optional[str] = None, no_worker_after: float = 10.0):
+        self.steal_after = steal_after
+        self.no_worker_after = no_worker_after
+        self.token = token or os.getenv(TOKEN_ENV)
+        self.config = {"max_memory_bytes": max_memory_bytes, "max_cpu_seconds": max_cpu_seconds}
+        self._cond = threading.Condition()
+        self._ids = itertools.count()
+        self._pending = collections.deque()
+        self._items = {}
+        self._futures = {}
+        self._submitted = {}
+        # sandbox slots of every connected worker
+        self._slots = {}
+        self._holders = collections.defaultdict(dict)
+        self._leases = collections.defaultdict(set)
+        # last time every worker leased, started or completed an item
+        self._progress = {}
+        self._closed = False
+        self.stats = collections.Counter()
+
+        coordinator = self
+
+        class Handler(socketserver.StreamRequestHandler):
+            def handle(self):
+                coordinator._serve(self.rfile, self.wfile, "%s:%d" % self.client_address)
+
+        self._server = _Server((host, port), Handler)
+        self.address = self._server.server_address
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        self._watchdog = threading.Thread(target=self._watch, daemon=True)
+        self._watchdog.start()
+
+    @property
+    def slots(self) -> int:
+        """
+        Total number of sandboxes of the connected workers.
+        """
+        with self._cond:
+            return sum(self._slots.values())
+
+    def submit(
+        self, problem: Dict, completion: str, timeout: float, completion_id: Optional[int] = None
+    ) -> Future:
+        future = Future()
+        with self._cond:
+            item_id = next(self._ids)
+            self._items[item_id] = (problem, completion, timeout, completion_id)
+            self._futures[item_id] = future
+            self._submitted[item_id] = time.monotonic()
+            self._pending.append(item_id)
+            self._cond.notify_all()
+        return future
+
+    def check_correctness(
+        self, problem: Dict, completion: str, timeout: float, completion_id: Optional[int] = None
+    ) -> Dict:
+        return self.submit(problem, completion, timeout, completion_id).result()
+
+    def _lease(self, worker: str, n: int, wait_time: float = 0.2) -> List[int]:
+        deadline = time.monotonic() + wait_time
+        with self._cond:
+            while not self._pending and not self._closed:
+                stolen = self._steal(worker, n)
+                if stolen:
+                    return stolen
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return []
+                self._cond.wait(remaining)
+
+            leased = []
+            self._progress[worker] = time.monotonic()
+            while self._pending and len(leased) < n:
+                item_id = self._pending.popleft()
+                if item_id not in self._items:
+                    continue
+                leased.append(item_id)
+                # not started yet, see `_start`
+                self._holders[item_id][worker] = None
+                self._leases[worker].add(item_id)
+            return leased
+
+    def _steal(self, worker: str, n: int) -> List[int]:
+        now = time.monotonic()
+
+        def overdue(item_id, holder, started):
+            if started is not None:
+                return now - started > self._items[item_id][2] + TIMEOUT_GRACE + self.steal_after
+            longest = max(self._items[leased][2] for leased in self._leases[holder])
+            return now - self._progress[holder] > longest + TIMEOUT_GRACE + self.steal_after
+
+        candidates = [
+            (min(self._progress[holder] for holder in holders), item_id)
+            for item_id, holders in self._holders.items()
+            if worker not in holders and all(overdue(item_id, holder, started)
+                                             for holder, started in holders.items())
+        ]
+        stolen = [item_id for _, item_id in sorted(candidates)[:n]]
+        if stolen:
+            self._progress[worker] = now
+        for item_id in stolen:
+            self._holders[item_id][worker] = None
+            self._leases[worker].add(item_id)
+        self.stats["stolen"] += len(stolen)
+        return stolen
+
+    def _start(self, worker: str, item_ids: List[int]):
+        now = time.monotonic()
+        with self._cond:
+            self._progress[worker] = now
+            for item_id in item_ids:
+                holders = self._holders.get(item_id)
+                if holders is not None and worker in holders:
+                    holders[worker] = now
+
+    def _complete(self, worker: str, result: Dict):
+        with self._cond:
+            item_id = result.pop("item_id")
+            self._progress[worker] = time.monotonic()
+            if item_id not in self._items:
+                # Already completed by another worker.
+                self.stats["duplicate_results"] += 1
+                return
+            self._remove(item_id).set_result(result)
+            self.stats["completed"] += 1
+
+    def _remove(self, item_id: int) -> Future:
+        del self._items[item_id]
+        del self._submitted[item_id]
+        for holder in self._holders.pop(item_id, {}):
+            self._leases[holder].discard(item_id)
+        # a pending item is skipped by `_lease`
+        return self._futures.pop(item_id)
+
+    def _watch(self):
+        with self._cond:
+            while not self._closed:
+                self._cond.wait(1.0)
+                now = time.monotonic()
+                last_progress = max(self._progress.values(), default=0.0)
+                for item_id, submitted in list(self._submitted.items()):
+                    idle = now - max(submitted, last_progress)
+                    if idle <= self.no_worker_after * (self._items[item_id][2] + TIMEOUT_GRACE):
+                        continue
+                    self._remove(item_id).set_exception(TimeoutError(
+                        f"no sandbox worker made progress for {idle:.0f}s "
+                        f"({len(self._slots)} connected, {self.stats['rejected']} rejected by the token check)"))
+                    self.stats["abandoned"] += 1
+
+    def _release(self, worker: str):
+        with self._cond:
+            self._slots.pop(worker, None)
+            for item_id in self._leases.pop(worker, set()):
+                holders = self._holders.get(item_id, {})
+                holders.pop(worker, None)
+                if not holders and item_id in self._items:
+                    self._holders.pop(item_id, None)
+                    self._pending.appendleft(item_id)
+                    self.stats["requeued"] += 1
+            self._cond.notify_all()
+
+    def _serve(self, rfile, wfile, worker: str):
+        sent_problems = set()
+        try:
+            hello = recv_message(rfile)
+            if hello is None or hello.get("type") != "hello":
+                return
+            if self.token is not None and not hmac.compare_digest(str(hello.get("token")).encode("utf-8"),
+                                                                   self.token.encode("utf-8")):
+                with self._cond:
+                    self.stats["rejected"] += 1
+                return
+            with self._cond:
+                self.stats["workers"] += 1
+                self._slots[worker] = max(1, int(hello.get("slots", 1)))
+            send_message(wfile, {"type": "config", **self.config})
+            while True:
+                message = recv_message(rfile)
+                if message is None:
+                    break
+                if message["type"] == "started":
+                    self._start(worker, message["items"])
+                elif message["type"] == "results":
+                    for result in message["items"]:
+                        self._complete(worker, result)
+                elif message["type"] == "get":
+                    if self._closed:
+                        send_message(wfile, {"type": "done"})
+                        break
+                    item_ids = self._lease(worker, message["n"])
+                    items, problems = [], {}
+                    with self._cond:
+                        for item_id in item_ids:
+                            if item_id not in self._items:
+                                continue
+                            problem, completion, timeout, completion_id = self._items[item_id]
+                            if problem["task_id"] not in sent_problems:
+                                problems[problem["task_id"]] = problem
+                                sent_problems.add(problem["task_id"])
+                            items.append({"item_id": item_id, "task_id": problem["task_id"],
+                                          "completion": completion, "timeout": timeout,
+                                          "completion_id": completion_id})
+                    send_message(wfile, {"type": "work", "items": items, "problems": problems})
+        except (OSError, ValueError):
+            pass
+        finally:
+            self._release(worker)
+
+    def close(self):
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+        # Give connected workers a moment to receive "done".
+        time.sleep(0.5)
+        self._server.shutdown()
+        self._server.server_close()
+
+
+def run_worker(coordinator: str, n_workers: int = 4, retry_for: float = 30.0, token: Optional[str] = None):
+    """
+    Connects to a coordinator at host:port and executes its work items on a
+    local `SandboxPool` until the coordinator is done. `token` defaults to
+    $HUMANEVAL_COORDINATOR_TOKEN.
+    """
+    host, port = coordinator.rsplit(":", 1)
+    deadline = time.monotonic() + retry_for
+    while True:
+        try:
+            sock = socket.create_connection((host, int(port)))
+            break
+        except OSError:
+            if time.monotonic() > deadline:
+                raise
+            time.sleep(0.5)
+
+    rfile, wfile = sock.makefile("rb"), sock.makefile("wb")
+    send_message(wfile, {"type": "hello", "slots": n_workers, "token": token or os.getenv(TOKEN_ENV)})
+    config = recv_message(rfile)
+    if config is None:
+        raise ConnectionError(f"coordinator {coordinator} rejected the worker, check the token")
+
+    problems = {}
+    inflight = {}
+    # items whose sandbox started since the last message
+    started = collections.deque()
+    capacity = 2 * n_workers
+
+    def execute(item):
+        started.append(item["item_id"])
+        return pool.check_correctness(problems[item["task_id"]], item["completion"], item["timeout"],
+                                      item["completion_id"])
+
+    with SandboxPool(n_workers, config["max_memory_bytes"], config["max_cpu_seconds"]) as pool, \
+            ThreadPoolExecutor(max_workers=n_workers) as executor:
+        while True:
+            if started:
+                send_message(wfile, {"type": "started",
+                                     "items": [started.popleft() for _ in range(len(started))]})
+            done = [future for future in inflight if future.done()]
+            if done:
+                results = []
+                for future in done:
+                    result = future.result()
+                    result["item_id"] = inflight.pop(future)
+                    results.append(result)
+                send_message(wfile, {"type": "results", "items": results})
+
+            if len(inflight) >= capacity:
+                wait(inflight, timeout=1.0, return_when=FIRST_COMPLETED)
+                continue
+
+            send_message(wfile, {"type": "get", "n": capacity - len(inflight)})
+            reply = recv_message(rfile)
+            if reply is None or reply["type"] == "done":
+                break
+            problems.update(reply["problems"])
+            for item in reply["items"]:
+                inflight[executor.submit(execute, item)] = item["item_id"]
+
+    rfile.close()
+    wfile.close()
+    sock.close()
+
+
+def start_local_workers(coordinator: str, n_processes: int, n_workers: int = 4,
+                        token: Optional[str] = None) -> List[subprocess.Popen]:
+    """
+    Starts worker processes on this host, mainly for testing.
+    """
+    root = path.dirname(path.dirname(path.abspath(__file__)))
+    # the token is passed in the environment, not on the command line
+    env = dict(os.environ, **{TOKEN_ENV: token}) if token else None
+    return [
+        subprocess.Popen([sys.executable, "-m", "utils.distributed", "--coordinator", coordinator,
+                          "--n_workers", str(n_workers)], cwd=root, env=env)
+        for _ in range(n_processes)
+    ]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Runs a sandbox worker for a distributed evaluation.")
+    parser.add_argument("--coordinator", type=str, required=True, help="host:port of the coordinator")
+    parser.add_argument("--n_workers", type=int, default=4)
+    parser.add_argument("--token", type=str, default=None,
+                        help="token the coordinator requires, defaults to $HUMANEVAL_COORDINATOR_TOKEN")
+    args = parser.parse_args()
+
+    run_worker(args.coordinator, args.n_workers, token=args.token)
@@ -1,15 +1,151 @@
+import ast
 import contextlib
 import faulthandler
 import io
+import math
 import multiprocessing
 import os
 import platform
+import queue
+import select
 import signal
+import struct
 import tempfile
-from typing import Dict, Optional
+import time
+import warnings
+from types import CodeType
+from typing import Dict, Optional, Tuple
 
+# How long a sandbox may overrun its timeout before it is killed.
+TIMEOUT_GRACE = 0.5
 
-def unsafe_execute(problem: Dict, completion: str, timeout: float, result):
+# Header of a sandbox result message: payload length and child start time.
+_HEADER = struct.Struct("<Qd")
+
+# Per-sample resource usage recorded with every executed result.
+USAGE_FIELDS = ("wall_time", "cpu_time", "peak_rss")
+
+# Result of a sample whose pool worker died, e.g. killed by the OOM killer.
+WORKER_CRASHED = "failed: sandbox worker crashed"
+
+
+def unsafe_execute(
+    problem: Dict,
+    completion: str,
+    timeout: float,
+    result,
+    max_memory_bytes: Optional[int] = None,
+    max_cpu_seconds: Optional[float] = None,
+):
+    started = time.monotonic()
+
+    # Imported before `reliability_guard` removes it from sys.modules.
+    import resource
+
+    # Own process group, so that the supervisor can kill every descendant.
+    os.setpgid(0, 0)
+
+    result.append(execute_check_program(problem, completion, timeout,
+                                        max_memory_bytes=max_memory_bytes, max_cpu_seconds=max_cpu_seconds))
+    result.append(dict(started=started, **_usage(resource.getrusage(resource.RUSAGE_SELF))))
+
+
+def _usage(rusage) -> Dict:
+    """
+    Converts a `resource.struct_rusage` into the usage fields of a result.
+    """
+    # ru_maxrss is in kilobytes on Linux and in bytes on macOS.
+    scale = 1 if platform.uname().system == "Darwin" else 1024
+    return {
+        "cpu_time": rusage.ru_utime + rusage.ru_stime,
+        "peak_rss": rusage.ru_maxrss * scale,
+    }
+
+
+def build_check_program(problem: Dict, completion: str) -> str:
+    return (
+        problem["prompt"]
+        + completion
+        + "\n"
+        + problem["test"]
+        + "\n"
+        + f"check({problem['entry_point']})"
+    )
+
+
+def compile_harness(problem: Dict) -> Tuple[CodeType, CodeType]:
+    """
+    Compiles the test code and the `check` call of a problem. Both are the
+    same for every completion of the problem, so they only need to be
+    compiled once per task.
+    """
+    return (
+        compile(problem["test"], "<string>", "exec"),
+        compile(f"check({problem['entry_point']})", "<string>", "exec"),
+    )
+
+
+# Calls that can define names dynamically, with them a missing entry point
+# cannot be decided statically.
+_DYNAMIC_NAMES = {"exec", "eval", "globals", "locals", "vars", "setattr", "__import__"}
+
+
+def prescreen(problem: Dict, completion: str) -> Optional[Tuple[str, str]]:
+    """
+    Statically checks the check program of a completion without running it.
+    Returns None if the program is plausible, or a (category, result) pair
+    where category is "syntax error", "indentation error" or "missing entry
+    point" and result is what the sandbox would have reported.
+    """
+    check_program = build_check_program(problem, completion)
+    try:
+        with warnings.catch_warnings():
+            warnings.simplefilter("ignore")
+            tree = ast.parse(check_program, "<string>")
+    except IndentationError as e:
+        return "indentation error", f"failed: {e}"
+    except (SyntaxError, ValueError) as e:
+        return "syntax error", f"failed: {e}"
+
+    entry_point = problem["entry_point"]
+    for node in ast.walk(tree):
+        if isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef)) and node.name == entry_point:
+            return None
+        if isinstance(node, ast.Name):
+            if node.id in _DYNAMIC_NAMES:
+                return None
+            if node.id == entry_point and not isinstance(node.ctx, ast.Load):
+                return None
+        if isinstance(node, (ast.Import, ast.ImportFrom)):
+            for alias in node.names:
+                if alias.name == "*" or (alias.asname or alias.name.split(".")[0]) == entry_point:
+                    return None
+        if isinstance(node, ast.Global) and entry_point in node.names:
+            return None
+        if isinstance(node, ast.NamedExpr) and node.target.id == entry_point:
+            return None
+
+    return "missing entry point", f"failed: name '{entry_point}' is not defined"
+
+
+def execute_check_program(
+    problem: Dict,
+    completion: str,
+    timeout: float,
+    harness: Optional[Tuple[CodeType, CodeType]] = None,
+    max_memory_bytes: Optional[int] = None,
+    max_cpu_seconds: Optional[float] = None,
+) -> str:
+    """
+    Runs the check program of a completion in the current process and returns
+    the result string. Must only be called from a disposable child process as
+    it applies `reliability_guard`.
+
+    :param harness: the precompiled test code of the problem from
+        `compile_harness`; then only the prompt and completion are compiled.
+    :param max_memory_bytes: optional address space limit of the process.
+    :param max_cpu_seconds: optional CPU time limit of the process.
+    """
     with create_tempdir():
 
         # These system calls are needed when cleaning up tempdir.
@@ -21,17 +157,14 @@ def unsafe_execute(problem: Dict, completion: str, timeout: float, result):
         chdir = os.chdir
 
         # Disable functionalities that can make destructive changes to the test.
-        reliability_guard()
+        # The CPU time limit also stops C-level loops that SIGALRM cannot interrupt.
+        if max_cpu_seconds is None:
+            max_cpu_seconds = timeout + TIMEOUT_GRACE
+        reliability_guard(max_memory_bytes, max_cpu_seconds)
 
         # Construct the check program and run it.
-        check_program = (
-            problem["prompt"]
-            + completion
-            + "\n"
-            + problem["test"]
-            + "\n"
-            + f"check({problem['entry_point']})"
-        )
+        if harness is None:
+            check_program = build_check_program(problem, completion)
 
         try:
             exec_globals = {}
@@ -47,21 +180,38 @@ def unsafe_execute(problem: Dict, completion: str, timeout: float, result):
                     # information on how OpenAI sandboxes its code, see the accompanying paper.
                     # Once you have read this disclaimer and taken appropriate precautions,
                     # uncomment the following line and proceed at your own risk:
-                    exec(check_program, exec_globals)
-            result.append("passed")
+                    if harness is None:
+                        exec(check_program, exec_globals)
+                    else:
+                        try:
+                            solution = compile(problem["prompt"] + completion + "\n", "<string>", "exec")
+                        except SyntaxError:
+                            # Report the error exactly as for the full check program.
+                            solution = compile(build_check_program(problem, completion), "<string>", "exec")
+                        exec(solution, exec_globals)
+                        exec(harness[0], exec_globals)
+                        exec(harness[1], exec_globals)
+            outcome = "passed"
         except TimeoutException:
-            result.append("timed out")
+            outcome = "timed out"
         except BaseException as e:
-            result.append(f"failed: {e}")
+            outcome = f"failed: {e}"
 
         # Needed for cleaning up.
         shutil.rmtree = rmtree
         os.rmdir = rmdir
         os.chdir = chdir
 
+    return outcome
+
 
 def check_correctness(
-    problem: Dict, completion: str, timeout: float, completion_id: Optional[int] = None
+    problem: Dict,
+    completion: str,
+    timeout: float,
+    completion_id: Optional[int] = None,
+    max_memory_bytes: Optional[int] = None,
+    max_cpu_seconds: Optional[float] = None,
 ) -> Dict:
     """
     Evaluates the functional correctness of a completion by running the test
@@ -69,28 +219,320 @@ def check_correctness(
 
     :param completion_id: an optional completion ID so we can match
         the results later even if execution finishes asynchronously.
+    :param max_memory_bytes: optional memory limit of the sandbox.
+    :param max_cpu_seconds: optional CPU time limit of the sandbox.
     """
 
-    manager = multiprocessing.Manager()
-    result = manager.list()
+    with multiprocessing.Manager() as manager:
+        result = manager.list()
+
+        start = time.monotonic()
+        p = multiprocessing.Process(target=unsafe_execute,
+                                    args=(problem, completion, timeout, result, max_memory_bytes, max_cpu_seconds))
+        p.start()
+        with contextlib.suppress(OSError):
+            os.setpgid(p.pid, p.pid)
+        p.join(timeout=timeout + TIMEOUT_GRACE)
+        # A sandbox that exited has been reaped by join, its pid may be reused.
+        kill_process_group(p.pid, alive=p.exitcode is None)
+        p.join()
+        wall_time = time.monotonic() - start
 
-    p = multiprocessing.Process(target=unsafe_execute, args=(problem, completion, timeout, result))
-    p.start()
-    p.join(timeout=timeout + 1)
-    if p.is_alive():
-        p.kill()
+        result = list(result)
 
     if not result:
         result.append("timed out")
+    usage = result[1] if len(result) > 1 else {"cpu_time": None, "peak_rss": None}
+    # CLOCK_MONOTONIC is system-wide, so the child's start time is comparable.
+    started = usage.pop("started", None)
+    usage["spawn_latency"] = started - start if started is not None else None
 
     return dict(
         task_id=problem["task_id"],
         passed=result[0] == "passed",
         result=result[0],
         completion_id=completion_id,
+        wall_time=wall_time,
+        **usage,
     )
 
 
+def fork_and_execute(
+    problem: Dict,
+    completion: str,
+    timeout: float,
+    harness: Optional[Tuple[CodeType, CodeType]] = None,
+    max_memory_bytes: Optional[int] = None,
+    max_cpu_seconds: Optional[float] = None,
+) -> Tuple[str, Dict]:
+    """
+    Forks a disposable child from the current (clean) process, runs the check
+    program in it and returns the result string read back over a pipe,
+    together with the wall time, CPU time, peak RSS and spawn latency of the child.
+    """
+    start = time.monotonic()
+    read_fd, write_fd = os.pipe()
+    pid = os.fork()
+    if pid == 0:
+        started = time.monotonic()
+        os.close(read_fd)
+        try:
+            os.setpgid(0, 0)
+            outcome = execute_check_program(problem, completion, timeout, harness,
+                                            max_memory_bytes, max_cpu_seconds)
+        except BaseException as e:
+            outcome = f"failed: {e}"
+        try:
+            # Length-prefixed, descendants may keep the pipe open after we exit.
+            message = outcome.encode("utf-8", errors="replace")
+            os.write(write_fd, _HEADER.pack(len(message), started) + message)
+        finally:
+            os._exit(0)
+
+    # Set the process group from both sides, the child may not have run yet.
+    with contextlib.suppress(OSError):
+        os.setpgid(pid, pid)
+    os.close(write_fd)
+    received = b""
+    expected = None
+    deadline = time.monotonic() + timeout + TIMEOUT_GRACE
+    try:
+        while expected is None or len(received) < expected:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0 or not select.select([read_fd], [], [], remaining)[0]:
+                break
+            chunk = os.read(read_fd, 65536)
+            if not chunk:
+                break
+            received += chunk
+            if expected is None and len(received) >= _HEADER.size:
+                length, started = _HEADER.unpack(received[:_HEADER.size])
+                expected = _HEADER.size + length
+    finally:
+        os.close(read_fd)
+        kill_process_group(pid)
+        _, _, rusage = os.wait4(pid, 0)
+        reap_orphans()
+
+    usage = dict(wall_time=time.monotonic() - start, **_usage(rusage))
+    usage["spawn_latency"] = started - start if expected is not None else None
+    if expected is None or len(received) < expected:
+        return "timed out", usage
+    return received[_HEADER.size:expected].decode("utf-8", errors="replace"), usage
+
+
+def kill_process_group(pid: int, alive: bool = True):
+    """
+    Kills a sandbox and every process it started in its process group. If
+    the group is gone, the sandbox itself is only killed if it is `alive`,
+    i.e. not reaped yet.
+    """
+    try:
+        os.killpg(pid, signal.SIGKILL)
+    except (ProcessLookupError, PermissionError):
+        if alive:
+            with contextlib.suppress(ProcessLookupError):
+                os.kill(pid, signal.SIGKILL)
+
+
+def set_child_subreaper():
+    """
+    Makes orphaned descendants of this process its children (Linux only), so
+    that `reap_orphans` can collect them.
+    """
+    if platform.uname().system != "Linux":
+        return
+    import ctypes
+
+    PR_SET_CHILD_SUBREAPER = 36
+    with contextlib.suppress(OSError, AttributeError):
+        ctypes.CDLL(None, use_errno=True).prctl(PR_SET_CHILD_SUBREAPER, 1, 0, 0, 0)
+
+
+def exit_with_parent():
+    """
+    Kills this process when its parent dies (Linux only), so that the sandboxes
+    of a killed evaluator do not linger and hold its files and sockets open.
+    """
+    if platform.uname().system != "Linux":
+        return
+    import ctypes
+
+    PR_SET_PDEATHSIG = 1
+    parent = os.getppid()
+    with contextlib.suppress(OSError, AttributeError):
+        ctypes.CDLL(None, use_errno=True).prctl(PR_SET_PDEATHSIG, signal.SIGKILL, 0, 0, 0)
+    if os.getppid() != parent:
+        os._exit(1)
+
+
+def reap_orphans():
+    while True:
+        try:
+            pid, _ = os.waitpid(-1, os.WNOHANG)
+        except ChildProcessError:
+            return
+        if pid == 0:
+            return
+
+
+def _zygote(conn, max_memory_bytes=None, max_cpu_seconds=None):
+    """
+    Worker loop of a `SandboxPool`. Receives jobs over `conn` and runs each of
+    them in a freshly forked child so that the zygote itself stays clean.
+
+    The test harness of every task is compiled once in the zygote and
+    inherited by the children of all later samples of that task. Problems are
+    sent once and referred to by key in later jobs.
+    """
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    set_child_subreaper()
+    exit_with_parent()
+    harnesses = {}
+    problems = {}
+    stats = {"compiled": 0, "reused": 0, "compile_time": 0.0, "saved_time": 0.0}
+    while True:
+        try:
+            job = conn.recv()
+        except EOFError:
+            break
+        if job is None:
+            break
+        if job == "stats":
+            conn.send(stats)
+            continue
+        ref, problem, completion, timeout = job
+        if problem is None:
+            problem = problems[ref]
+        else:
+            problems[ref] = problem
+
+        key = (problem["task_id"], problem["test"], problem["entry_point"])
+        if key in harnesses:
+            harness, compile_time = harnesses[key]
+            stats["reused"] += 1
+            stats["saved_time"] += compile_time
+        else:
+            start = time.perf_counter()
+            try:
+                harness = compile_harness(problem)
+            except SyntaxError:
+                harness = None
+            compile_time = time.perf_counter() - start
+            harnesses[key] = (harness, compile_time)
+            stats["compiled"] += 1
+            stats["compile_time"] += compile_time
+
+        conn.send(fork_and_execute(problem, completion, timeout, harness, max_memory_bytes, max_cpu_seconds))
+
+
+class SandboxPool:
+    """
+    A pool of warm sandbox workers. Each worker is a long-lived zygote process
+    that forks one disposable child per sample, so a sample costs a single
+    `fork` instead of starting a `Manager` server and a new `Process`.
+
+    `check_correctness` is thread-safe and has the same signature and return
+    value as the module-level `check_correctness`; the resource limits are
+    set for the whole pool. Each problem is pickled to a worker once, later
+    samples of the task only send its key.
+    """
+
+    def __init__(
+        self, n_workers: int = 4, max_memory_bytes: Optional[int] = None, max_cpu_seconds: Optional[float] = None
+    ):
+        # Zygotes, including replacements of crashed ones, are forked from a
+        # single-threaded fork server rather than from this process, which
+        # may be running threads. Entry points need a __main__ guard.
+        self._ctx = multiprocessing.get_context("forkserver")
+        self._ctx.set_forkserver_preload(["__main__", "utils.execution"])
+        self._limits = (max_memory_bytes, max_cpu_seconds)
+        self._idle = queue.Queue()
+        self._workers = []
+        for _ in range(n_workers):
+            self._idle.put(self._start_worker())
+
+    def _start_worker(self):
+        parent_conn, child_conn = self._ctx.Pipe()
+        p = self._ctx.Process(target=_zygote, args=(child_conn, *self._limits), daemon=True)
+        p.start()
+        child_conn.close()
+        worker = (p, parent_conn, set())
+        self._workers.append(worker)
+        return worker
+
+    def _discard_worker(self, worker):
+        p, conn, _ = worker
+        conn.close()
+        if p.is_alive():
+            p.kill()
+        p.join()
+        self._workers.remove(worker)
+
+    def check_correctness(
+        self, problem: Dict, completion: str, timeout: float, completion_id: Optional[int] = None
+    ) -> Dict:
+        # str caches its hash, so the key is cheap for repeated samples of a task
+        ref = (problem["task_id"], hash(problem["prompt"]), hash(problem["test"]))
+        worker = self._idle.get()
+        try:
+            # A zygote that died while idle, e.g. killed by the OOM killer, is
+            # only noticed here. The sample is retried once on its replacement
+            # and recorded as failed only if that one dies as well.
+            for attempt in range(2):
+                try:
+                    sent = worker[2]
+                    worker[1].send((ref, None if ref in sent else problem, completion, timeout))
+                    sent.add(ref)
+                    outcome, usage = worker[1].recv()
+                    break
+                except (EOFError, OSError):
+                    self._discard_worker(worker)
+                    worker = self._start_worker()
+                    outcome, usage = WORKER_CRASHED, {}
+        finally:
+            self._idle.put(worker)
+
+        return dict(
+            task_id=problem["task_id"],
+            passed=outcome == "passed",
+            result=outcome,
+            completion_id=completion_id,
+            **usage,
+        )
+
+    def compile_stats(self) -> Dict:
+        """
+        Returns how often test harnesses were compiled and reused across all
+        workers, and the compile time saved by reusing them.
+        """
+        total = {"compiled": 0, "reused": 0, "compile_time": 0.0, "saved_time": 0.0}
+        workers = [self._idle.get() for _ in range(len(self._workers))]
+        try:
+            for _, conn, _ in workers:
+                conn.send("stats")
+                for key, value in conn.recv().items():
+                    total[key] += value
+        finally:
+            for worker in workers:
+                self._idle.put(worker)
+        return total
+
+    def close(self):
+        for p, conn, _ in list(self._workers):
+            with contextlib.suppress(OSError):
+                conn.send(None)
+        for worker in list(self._workers):
+            worker[0].join(timeout=1)
+            self._discard_worker(worker)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
 @contextlib.contextmanager
 def time_limit(seconds: float):
     def signal_handler(signum, frame):
@@ -160,7 +602,7 @@ def chdir(root):
         os.chdir(cwd)
 
 
-def reliability_guard(maximum_memory_bytes: Optional[int] = None):
+def reliability_guard(maximum_memory_bytes: Optional[int] = None, maximum_cpu_seconds: Optional[float] = None):
     """
     This disables various destructive functions and prevents the generated code
     from interfering with the test (e.g. fork bomb, killing other processes,
@@ -181,6 +623,13 @@ def reliability_guard(maximum_memory_bytes: Optional[int] = None):
         if not platform.uname().system == "Darwin":
             resource.setrlimit(resource.RLIMIT_STACK, (maximum_memory_bytes, maximum_memory_bytes))
 
+    if maximum_cpu_seconds is not None:
+        import resource
+
+        # SIGXCPU at the soft limit, SIGKILL one second later.
+        seconds = max(1, int(math.ceil(maximum_cpu_seconds)))
+        resource.setrlimit(resource.RLIMIT_CPU, (seconds, seconds + 1))
+
     faulthandler.disable()
 
     import builtins
@@ -200,6 +649,9 @@ def reliability_guard(maximum_memory_bytes: Optional[int] = None):
     os.rmdir = None
     os.fchdir = None
     os.setuid = None
+    os.setsid = None
+    os.setpgid = None
+    os.setpgrp = None
     os.fork = None
     os.forkpty = None
     os.killpg = None
@@ -0,0 +1,150 @@
+import contextlib
+import hashlib
+import json
+import os
+import shutil
+import time
+from typing import Dict, List, Optional, Tuple
+
+
+DEFAULT_GENERATION_CACHE_DIR = os.path.join(os.path.expanduser("~"), ".cache", "humaneval", "generations")
+
+
+class GenerationCache:
+    """
+    Persistent cache of agent completions. An entry holds every completion
+    generated so far for one (model, base_url, system instruction, prompt,
+    sampling parameters, seed); requesting n completions returns the first n,
+    so a larger n only generates the missing ones.
+
+    Entries older than `max_age` seconds are dropped, and least recently used
+    entries are evicted first when the cache exceeds `max_bytes`. The
+    modification time of an entry's file is its creation time and the access
+    time its last use, so eviction only needs to stat the files.
+    """
+
+    def __init__(self, cache_dir: str = DEFAULT_GENERATION_CACHE_DIR, max_bytes: int = 1024 * 1024 * 1024,
+                 max_age: Optional[float] = 30 * 24 * 3600):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        self.hits = 0
+        self.partial_hits = 0
+        self.misses = 0
+        self.cached_completions = 0
+        self.generated_completions = 0
+        os.makedirs(cache_dir, exist_ok=True)
+
+    @staticmethod
+    def key(model: str, base_url: Optional[str], system_instruction: str, prompt: str,
+            sampling_params: Optional[Dict] = None, seed: Optional[int] = None) -> str:
+        spec = [model, base_url, system_instruction, prompt, sampling_params or {}, seed]
+        return hashlib.sha256(json.dumps(spec, sort_keys=True).encode("utf-8")).hexdigest()
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.cache_dir, key[:2], key + ".json")
+
+    def _expired(self, st: os.stat_result) -> bool:
+        return self.max_age is not None and time.time() - st.st_mtime > self.max_age
+
+    def _load(self, path: str) -> Optional[Tuple[List[str], float]]:
+        """
+        Returns the completions of an entry and its creation time.
+        """
+        try:
+            st = os.stat(path)
+            if self._expired(st):
+                return None
+            with open(path, "r") as fp:
+                entry = json.load(fp)
+        except (OSError, ValueError):
+            return None
+        return entry["completions"], st.st_mtime
+
+    def get(self, key: str, n: int) -> List[str]:
+        """
+        Returns up to n cached completions and records a hit, partial hit or miss.
+        """
+        path = self._path(key)
+        entry = self._load(path)
+        completions = entry[0][:n] if entry is not None else []
+        if entry is not None:
+            # Refresh the access time used for LRU eviction, keep the creation time.
+            with contextlib.suppress(OSError):
+                os.utime(path, (time.time(), entry[1]))
+
+        if len(completions) >= n:
+            self.hits += 1
+        elif completions:
+            self.partial_hits += 1
+        else:
+            self.misses += 1
+        self.cached_completions += len(completions)
+        return completions
+
+    def extend(self, key: str, completions: List[str]):
+        """
+        Appends newly generated completions to an entry.
+        """
+        if not completions:
+            return
+        self.generated_completions += len(completions)
+        path = self._path(key)
+        cached, created = self._load(path) or ([], time.time())
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w") as fp:
+            json.dump({"completions": cached + completions}, fp)
+        os.utime(tmp_path, (time.time(), created))
+        os.replace(tmp_path, path)
+
+    def evict(self):
+        """
+        Removes expired entries, then the least recently used ones until the
+        cache fits in `max_bytes`.
+        """
+        entries = []
+        total = 0
+        for root, _, files in os.walk(self.cache_dir):
+            for name in files:
+                if not name.endswith(".json"):
+                    continue
+                path = os.path.join(root, name)
+                try:
+                    st = os.stat(path)
+                    if self._expired(st):
+                        os.remove(path)
+                        continue
+                except OSError:
+                    continue
+                entries.append((st.st_atime, st.st_size, path))
+                total += st.st_size
+
+        entries.sort()
+        for _, size, path in entries:
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                continue
+            total -= size
+
+    def clear(self):
+        shutil.rmtree(self.cache_dir, ignore_errors=True)
+        os.makedirs(self.cache_dir, exist_ok=True)
+
+    def reset_stats(self):
+        self.hits = self.partial_hits = self.misses = 0
+        self.cached_completions = self.generated_completions = 0
+
+    def stats(self) -> Dict:
+        lookups = self.hits + self.partial_hits + self.misses
+        return {
+            "hits": self.hits,
+            "partial_hits": self.partial_hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "cached_completions": self.cached_completions,
+            "generated_completions": self.generated_completions,
+        }
@@ -0,0 +1,60 @@
+import os
+import subprocess
+import sys
+from typing import List
+
+
+# Import time the evaluator CLI should stay under before it starts working.
+STARTUP_BUDGET = 0.5
+
+_MARKER = "import profile: startup done"
+
+
+def mark_startup():
+    """
+    Marks the end of startup in a command run by `profile_imports`; imports
+    after it count as deferred.
+    """
+    if os.environ.get("HUMANEVAL_IMPORT_PROFILE"):
+        sys.stderr.write(_MARKER + "\n")
+        sys.stderr.flush()
+
+
+def profile_imports(argv: List[str], top: int = 20, budget: float = STARTUP_BUDGET) -> int:
+    """
+    Runs `python -X importtime <argv>`, passes its output through and then
+    prints the modules with the largest cumulative import time, and the import
+    time until `mark_startup` against `budget` seconds.
+    Returns the exit code of the command.
+    """
+    env = dict(os.environ, HUMANEVAL_IMPORT_PROFILE="1")
+    proc = subprocess.Popen([sys.executable, "-X", "importtime", *argv], stderr=subprocess.PIPE, text=True, env=env)
+    imports = []
+    n_startup = None
+    for line in proc.stderr:
+        if line.rstrip() == _MARKER:
+            n_startup = len(imports)
+            continue
+        if not line.startswith("import time:"):
+            sys.stderr.write(line)
+            continue
+        fields = line[len("import time:"):].split("|")
+        if len(fields) != 3 or not fields[0].strip().isdigit():
+            continue  # the header line
+        self_us, cumulative_us, name = int(fields[0]), int(fields[1]), fields[2].rstrip()
+        # Nested imports are indented by two spaces per level.
+        depth = (len(name) - len(name.lstrip())) // 2
+        imports.append((cumulative_us, self_us, depth, name.strip()))
+    returncode = proc.wait()
+
+    def total(imports):
+        return sum(cumulative_us for cumulative_us, _, depth, _ in imports if depth == 0) / 1e6
+
+    startup = total(imports[:n_startup])
+    print(f"\nImport profile: {len(imports)} modules, {total(imports):.3f}s total import time, "
+          f"{startup:.3f}s before startup was done "
+          f"({'within' if startup <= budget else 'over'} the {budget:.3f}s startup budget)")
+    print(f"{'cumulative':>12}  {'self':>10}  module")
+    for cumulative_us, self_us, depth, name in sorted(imports, reverse=True)[:top]:
+        print(f"{cumulative_us / 1e3:>10.1f}ms  {self_us / 1e3:>8.1f}ms  {'  ' * depth}{name}")
+    return returncode
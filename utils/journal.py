@@ -0,0 +1,59 @@
+import json
+import os
+from typing import Dict, Optional
+
+from utils.execution import USAGE_FIELDS
+from utils.utils import JsonlWriter
+
+
+class RunJournal:
+    """
+    Append-only journal of finished samples keyed by (task_id, completion_id).
+
+    Every result is appended and flushed as soon as it is known, so a run that
+    dies can be resumed: with `resume=True` the existing journal is loaded and
+    its results are reused for samples whose completion did not change.
+    """
+
+    def __init__(self, filename: str, resume: bool = False, fsync_every: int = 50):
+        self.filename = filename
+        self.entries = {}
+        if resume and os.path.exists(filename):
+            self._load()
+        else:
+            open(filename, "w").close()
+        self._writer = JsonlWriter(filename, flush_every=1, append=True)
+        self._fsync_every = fsync_every
+
+    def _load(self):
+        valid_size = 0
+        with open(self.filename, "rb") as fp:
+            for line in fp:
+                # A crash can leave a truncated last record, stop at the first bad line.
+                if not line.endswith(b"\n"):
+                    break
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    break
+                self.entries[(record["task_id"], record["completion_id"])] = record
+                valid_size += len(line)
+        os.truncate(self.filename, valid_size)
+
+    def lookup(self, task_id: str, completion_id: int, completion: str) -> Optional[Dict]:
+        record = self.entries.get((task_id, completion_id))
+        if record is None or record["completion"] != completion:
+            return None
+        return dict(task_id=task_id, passed=record["passed"], result=record["result"],
+                    **{field: record[field] for field in USAGE_FIELDS if field in record})
+
+    def record(self, task_id: str, completion_id: int, completion: str, result: Dict):
+        self._writer.write(dict(task_id=task_id, completion_id=completion_id, completion=completion,
+                                result=result["result"], passed=result["passed"],
+                                **{field: result[field] for field in USAGE_FIELDS if field in result}))
+        if self._writer.n_records % self._fsync_every == 0:
+            self._writer.flush(sync=True)
+
+    def close(self):
+        self._writer.flush(sync=True)
+        self._writer.close()
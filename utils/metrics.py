@@ -0,0 +1,77 @@
+import contextlib
+import json
+import threading
+import time
+from collections import Counter, defaultdict
+from typing import Dict
+
+
+# Bucket edges of the latency histograms, in seconds.
+BUCKETS = [0.0, 0.001, 0.01, 0.1, 1.0, 10.0, float("inf")]
+
+
+class Metrics:
+    """
+    Collects per-stage durations, latency observations, counters and gauges
+    (e.g. throughput) of an evaluation run. Thread-safe, so samples can be observed from executor
+    threads.
+    """
+
+    def __init__(self):
+        self.stages = defaultdict(float)
+        self.observations = defaultdict(list)
+        self.counters = Counter()
+        self.gauges = {}
+        self._lock = threading.Lock()
+
+    @contextlib.contextmanager
+    def stage(self, name: str):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - start
+            with self._lock:
+                self.stages[name] += elapsed
+
+    def observe(self, name: str, value: float):
+        with self._lock:
+            self.observations[name].append(value)
+
+    def count(self, name: str, n: int = 1):
+        with self._lock:
+            self.counters[name] += n
+
+    def set(self, name: str, value: float):
+        with self._lock:
+            self.gauges[name] = value
+
+    def summary(self) -> Dict:
+        import numpy as np
+
+        with self._lock:
+            histograms = {}
+            for name, values in self.observations.items():
+                values = np.asarray(values, dtype=float)
+                p50, p90, p99 = np.percentile(values, [50, 90, 99]).tolist()
+                histograms[name] = {
+                    "count": len(values),
+                    "sum": values.sum().item(),
+                    "mean": values.mean().item(),
+                    "p50": p50,
+                    "p90": p90,
+                    "p99": p99,
+                    "max": values.max().item(),
+                    "buckets": dict(zip([f"<{edge}" for edge in BUCKETS[1:]],
+                                        np.histogram(values, BUCKETS)[0].tolist())),
+                }
+            return {
+                "stages": dict(self.stages),
+                "histograms": histograms,
+                "counters": dict(self.counters),
+                "gauges": dict(self.gauges),
+            }
+
+    def save(self, filename: str):
+        with open(filename, "w") as fp:
+            json.dump(self.summary(), fp, indent=2)
@@ -0,0 +1,105 @@
+import hashlib
+import json
+import mmap
+import os
+from collections.abc import Mapping
+from typing import Dict, Iterable, Iterator, Optional
+
+from utils.utils import stream_jsonl
+
+
+DEFAULT_STORE_DIR = os.path.join(os.path.expanduser("~"), ".cache", "humaneval", "problems")
+
+
+def _source_info(evalset_file: str) -> Dict:
+    stat = os.stat(evalset_file)
+    return {"source": os.path.abspath(evalset_file), "mtime": stat.st_mtime, "size": stat.st_size}
+
+
+def build_problem_store(evalset_file: str, store_file: str) -> str:
+    """
+    Decompresses a problem file once into `store_file`, one uncompressed JSON
+    problem per line, and writes the byte range of every task to
+    `store_file + ".index"`. Both files are written atomically.
+    """
+    index = {}
+    offset = 0
+    with open(store_file + ".tmp", "wb") as fp:
+        for problem in stream_jsonl(evalset_file):
+            line = json.dumps(problem).encode("utf-8") + b"\n"
+            fp.write(line)
+            index[problem["task_id"]] = (offset, len(line))
+            offset += len(line)
+    with open(store_file + ".index.tmp", "w") as fp:
+        json.dump({**_source_info(evalset_file), "tasks": index}, fp)
+    os.replace(store_file + ".tmp", store_file)
+    os.replace(store_file + ".index.tmp", store_file + ".index")
+    return store_file
+
+
+class ProblemStore(Mapping):
+    """
+    Read-only mapping of task_id to problem backed by a store file built by
+    `build_problem_store`. The file is memory-mapped and a problem is only
+    parsed when it is first accessed, so opening a store costs one read of
+    the index regardless of the size of the dataset. With `task_ids`, the
+    store is restricted to these tasks without reading the others.
+    """
+
+    def __init__(self, store_file: str, task_ids: Optional[Iterable[str]] = None):
+        self.store_file = store_file
+        with open(store_file + ".index", "r") as fp:
+            self.index = json.load(fp)["tasks"]
+        if task_ids is not None:
+            missing = [task_id for task_id in task_ids if task_id not in self.index]
+            if missing:
+                raise KeyError(f"unknown task_ids: {missing}")
+            self.index = {task_id: self.index[task_id] for task_id in task_ids}
+        self._fp = open(store_file, "rb")
+        self._mmap = mmap.mmap(self._fp.fileno(), 0, access=mmap.ACCESS_READ) if self.index else None
+        self._problems = {}
+
+    def __getitem__(self, task_id: str) -> Dict:
+        problem = self._problems.get(task_id)
+        if problem is None:
+            offset, length = self.index[task_id]
+            problem = json.loads(self._mmap[offset:offset + length])
+            self._problems[task_id] = problem
+        return problem
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self.index)
+
+    def __len__(self) -> int:
+        return len(self.index)
+
+    def close(self):
+        if self._mmap is not None:
+            self._mmap.close()
+        self._fp.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def open_problem_store(evalset_file: str, task_ids: Optional[Iterable[str]] = None,
+                       store_dir: str = DEFAULT_STORE_DIR) -> ProblemStore:
+    """
+    Opens the store of a problem file, building it first if it is missing or
+    older than the problem file.
+    """
+    os.makedirs(store_dir, exist_ok=True)
+    name = hashlib.sha256(os.path.abspath(evalset_file).encode("utf-8")).hexdigest()[:16]
+    store_file = os.path.join(store_dir, name + ".jsonl")
+    try:
+        with open(store_file + ".index", "r") as fp:
+            index = json.load(fp)
+        fresh = all(index[key] == value for key, value in _source_info(evalset_file).items())
+    except (OSError, ValueError, KeyError):
+        fresh = False
+    if not fresh:
+        build_problem_store(evalset_file, store_file)
+    return ProblemStore(store_file, task_ids)
@@ -0,0 +1,193 @@
+from __future__ import annotations
+
+import array
+import math
+from typing import Dict, Iterator, List, Tuple, TYPE_CHECKING
+
+# numpy is only needed to aggregate and save a store.
+if TYPE_CHECKING:
+    import numpy as np
+
+
+# Status code of every sample, `passed` is derived from it.
+STATUS = ("pending", "passed", "failed", "timed out", "skipped")
+PENDING, PASSED, FAILED, TIMED_OUT, SKIPPED = range(len(STATUS))
+
+
+class ResultStore:
+    """
+    Columnar store of per-sample results. Every sample is one row of compact
+    arrays: the index of its task in the interned `task_ids`, its completion
+    id, a status code, the index of its result message in the interned
+    `messages`, and its resource usage. Completions are concatenated into one
+    UTF-8 buffer addressed by offsets, and are not kept if `keep_completions`
+    is False.
+
+    Rows are reserved with `add` in the order the samples are read and filled
+    with `set_result` in any order. Iterating over the store yields the
+    samples as dicts, in the order they were added.
+    """
+
+    def __init__(self, keep_completions: bool = True):
+        self.keep_completions = keep_completions
+        self.task_ids = []
+        self._task_index = {}
+        self.messages = []
+        self._message_index = {}
+        self.task = array.array("i")
+        self.completion_id = array.array("i")
+        self.status = array.array("b")
+        self.message = array.array("i")
+        self.wall_time = array.array("d")
+        self.cpu_time = array.array("d")
+        self.peak_rss = array.array("q")
+        self.completion_offsets = array.array("q", [0])
+        self._text = bytearray()
+        # row of every completion id of every task
+        self._rows = []
+        # fields of the input samples besides task_id and completion
+        self._extras = {}
+
+    def __len__(self) -> int:
+        return len(self.status)
+
+    def _intern_message(self, message: str) -> int:
+        index = self._message_index.get(message)
+        if index is None:
+            index = self._message_index[message] = len(self.messages)
+            self.messages.append(message)
+        return index
+
+    def add(self, sample: Dict) -> int:
+        """
+        Reserves a row for a sample and returns its completion id within its task.
+        """
+        task_id = sample["task_id"]
+        task = self._task_index.get(task_id)
+        if task is None:
+            task = self._task_index[task_id] = len(self.task_ids)
+            self.task_ids.append(task_id)
+            self._rows.append(array.array("i"))
+        row = len(self.status)
+        cid = len(self._rows[task])
+        self._rows[task].append(row)
+
+        self.task.append(task)
+        self.completion_id.append(cid)
+        self.status.append(PENDING)
+        self.message.append(-1)
+        self.wall_time.append(math.nan)
+        self.cpu_time.append(math.nan)
+        self.peak_rss.append(-1)
+        if self.keep_completions:
+            self._text += sample["completion"].encode("utf-8")
+            extras = {key: value for key, value in sample.items() if key not in ("task_id", "completion")}
+            if extras:
+                self._extras[row] = extras
+        self.completion_offsets.append(len(self._text))
+        return cid
+
+    def set_result(self, task_id: str, cid: int, result: Dict):
+        row = self._rows[self._task_index[task_id]][cid]
+        if result["passed"] is None:
+            self.status[row] = SKIPPED
+        elif result["passed"]:
+            self.status[row] = PASSED
+        elif result["result"] == "timed out":
+            self.status[row] = TIMED_OUT
+        else:
+            self.status[row] = FAILED
+        self.message[row] = self._intern_message(result["result"])
+        if result.get("wall_time") is not None:
+            self.wall_time[row] = result["wall_time"]
+        if result.get("cpu_time") is not None:
+            self.cpu_time[row] = result["cpu_time"]
+        if result.get("peak_rss") is not None:
+            self.peak_rss[row] = result["peak_rss"]
+
+    def counts(self) -> Tuple[List[str], np.ndarray, np.ndarray]:
+        """
+        Returns the task_ids and, per task, the number of evaluated samples
+        (skipped ones excluded) and of passed samples.
+        """
+        import numpy as np
+
+        task = np.array(self.task, dtype=np.int32)
+        status = np.array(self.status, dtype=np.int8)
+        evaluated = (status != SKIPPED) & (status != PENDING)
+        total = np.bincount(task[evaluated], minlength=len(self.task_ids))
+        correct = np.bincount(task[status == PASSED], minlength=len(self.task_ids))
+        return self.task_ids, total, correct
+
+    def record(self, row: int, with_task_id: bool = True) -> Dict:
+        record = {"task_id": self.task_ids[self.task[row]]} if with_task_id else {}
+        if self.keep_completions:
+            start, end = self.completion_offsets[row], self.completion_offsets[row + 1]
+            record["completion"] = self._text[start:end].decode("utf-8")
+            record.update(self._extras.get(row, {}))
+        status = self.status[row]
+        record["result"] = self.messages[self.message[row]] if self.message[row] >= 0 else STATUS[status]
+        record["passed"] = None if status in (PENDING, SKIPPED) else status == PASSED
+        if not math.isnan(self.wall_time[row]):
+            record["wall_time"] = self.wall_time[row]
+        if not math.isnan(self.cpu_time[row]):
+            record["cpu_time"] = self.cpu_time[row]
+        if self.peak_rss[row] >= 0:
+            record["peak_rss"] = self.peak_rss[row]
+        return record
+
+    def __iter__(self) -> Iterator[Dict]:
+        for row in range(len(self)):
+            yield self.record(row)
+
+    def task_records(self, task_id: str) -> Iterator[Dict]:
+        """
+        Yields the samples of one task in completion id order, without their task_id.
+        """
+        for row in self._rows[self._task_index[task_id]]:
+            yield self.record(row, with_task_id=False)
+
+    def save_npz(self, filename: str):
+        """
+        Writes all columns to a compressed .npz file, see `load_npz`.
+        """
+        import numpy as np
+
+        np.savez_compressed(
+            filename,
+            task_ids=np.array(self.task_ids, dtype=str),
+            messages=np.array(self.messages, dtype=str),
+            status_names=np.array(STATUS, dtype=str),
+            task=np.array(self.task, dtype=np.int32),
+            completion_id=np.array(self.completion_id, dtype=np.int32),
+            status=np.array(self.status, dtype=np.int8),
+            message=np.array(self.message, dtype=np.int32),
+            wall_time=np.array(self.wall_time, dtype=np.float64),
+            cpu_time=np.array(self.cpu_time, dtype=np.float64),
+            peak_rss=np.array(self.peak_rss, dtype=np.int64),
+            completion_offsets=np.array(self.completion_offsets, dtype=np.int64),
+            completions=np.frombuffer(bytes(self._text), dtype=np.uint8),
+        )
+
+    @classmethod
+    def load_npz(cls, filename: str) -> "ResultStore":
+        """
+        Loads a store written by `save_npz`. Extra sample fields are not saved.
+        """
+        import numpy as np
+
+        with np.load(filename) as data:
+            store = cls(keep_completions=len(data["completions"]) > 0 or len(data["status"]) == 0)
+            store.task_ids = data["task_ids"].tolist()
+            store._task_index = {task_id: i for i, task_id in enumerate(store.task_ids)}
+            store.messages = data["messages"].tolist()
+            store._message_index = {message: i for i, message in enumerate(store.messages)}
+            for name, typecode in (("task", "i"), ("completion_id", "i"), ("status", "b"), ("message", "i"),
+                                   ("wall_time", "d"), ("cpu_time", "d"), ("peak_rss", "q"),
+                                   ("completion_offsets", "q")):
+                setattr(store, name, array.array(typecode, data[name].tobytes()))
+            store._text = bytearray(data["completions"].tobytes())
+        store._rows = [array.array("i") for _ in store.task_ids]
+        for row, task in enumerate(store.task):
+            store._rows[task].append(row)
+        return store
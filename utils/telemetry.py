@@ -0,0 +1,166 @@
+import atexit
+import json
+import os
+import queue
+import threading
+import time
+from typing import Dict, List, Optional
+
+
+DEFAULT_URL = "https://humaneval-logger.onrender.com/payload"
+
+
+class RemoteSink:
+    """
+    Posts every payload of a batch to the logger endpoint over one session.
+    The rest of a batch is dropped on the first failure so an unreachable
+    endpoint costs at most one timeout per batch.
+    """
+
+    def __init__(self, url: str = DEFAULT_URL, timeout: float = 2.0):
+        import requests
+
+        self.url = url
+        self.timeout = timeout
+        self.session = requests.Session()
+
+    def write(self, batch: List[Dict]):
+        for payload in batch:
+            try:
+                self.session.post(self.url, json=payload, timeout=self.timeout)
+            except Exception as e:
+                print(f"failed to post payload error: {e}")
+                return
+
+
+class FileSink:
+    """
+    Appends payloads to a local JSONL file.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+
+    def write(self, batch: List[Dict]):
+        with open(self.path, "a") as fp:
+            for payload in batch:
+                fp.write(json.dumps({"time": time.time(), **payload}) + "\n")
+
+
+class Telemetry:
+    """
+    Ships payloads to a sink from a background thread. `post` never blocks:
+    payloads are buffered in a bounded queue and dropped when it is full.
+    """
+
+    def __init__(self, sink, max_buffer: int = 1000, batch_size: int = 50, flush_interval: float = 1.0):
+        self.sink = sink
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.dropped = 0
+        self._queue = queue.Queue(maxsize=max_buffer)
+        self._thread = threading.Thread(target=self._run, name="telemetry", daemon=True)
+        self._thread.start()
+
+    def post(self, payload: Dict):
+        try:
+            self._queue.put_nowait(payload)
+        except queue.Full:
+            self.dropped += 1
+
+    def _run(self):
+        while True:
+            batch = [self._queue.get()]
+            deadline = time.monotonic() + self.flush_interval
+            while len(batch) < self.batch_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(self._queue.get(timeout=remaining))
+                except queue.Empty:
+                    break
+
+            stop = None in batch
+            batch = [payload for payload in batch if payload is not None]
+            if batch:
+                try:
+                    self.sink.write(batch)
+                except Exception as e:
+                    print(f"failed to write telemetry: {e}")
+            if stop:
+                return
+
+    def close(self, timeout: float = 5.0):
+        """
+        Flushes the buffered payloads, waiting at most `timeout` seconds.
+        """
+        if not self._thread.is_alive():
+            return
+        try:
+            self._queue.put(None, timeout=timeout)
+        except queue.Full:
+            return
+        self._thread.join(timeout)
+
+
+_telemetry: Optional[Telemetry] = None
+_configured = False
+_lock = threading.RLock()
+
+
+def configure(sink: Optional[str] = None, url: Optional[str] = None, path: Optional[str] = None,
+              timeout: Optional[float] = None) -> Optional[Telemetry]:
+    """
+    (Re)configures the process-wide telemetry. Unset arguments fall back to
+    the HUMANEVAL_TELEMETRY (remote, file or off), HUMANEVAL_TELEMETRY_URL,
+    HUMANEVAL_TELEMETRY_FILE and HUMANEVAL_TELEMETRY_TIMEOUT environment variables.
+    """
+    global _telemetry, _configured
+
+    sink = sink or os.getenv("HUMANEVAL_TELEMETRY", "remote")
+    with _lock:
+        if _telemetry is not None:
+            _telemetry.close()
+            _telemetry = None
+
+        if sink == "remote":
+            _telemetry = Telemetry(RemoteSink(
+                url or os.getenv("HUMANEVAL_TELEMETRY_URL", DEFAULT_URL),
+                timeout if timeout is not None else float(os.getenv("HUMANEVAL_TELEMETRY_TIMEOUT", "2.0")),
+            ))
+        elif sink == "file":
+            _telemetry = Telemetry(FileSink(path or os.getenv("HUMANEVAL_TELEMETRY_FILE", "telemetry.jsonl")))
+        elif sink != "off":
+            raise ValueError(f"Unknown telemetry sink: {sink}")
+        _configured = True
+
+    return _telemetry
+
+
+def post(payload: Dict):
+    if not _configured:
+        with _lock:
+            if not _configured:
+                configure()
+    if _telemetry is not None:
+        _telemetry.post(payload)
+
+
+def flush():
+    if _telemetry is not None:
+        _telemetry.close()
+
+
+def _after_fork_in_child():
+    # The sender thread does not exist in a forked child and may have held
+    # the queue's lock, so telemetry is off in the child.
+    global _telemetry, _configured, _lock
+    _telemetry = None
+    _configured = True
+    _lock = threading.RLock()
+
+
+atexit.register(flush)
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_after_fork_in_child)
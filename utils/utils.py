@@ -1,19 +1,24 @@
-from typing import Iterable, Dict, Union, List
+from __future__ import annotations
+
+from typing import Iterable, Dict, Union, List, TYPE_CHECKING
 import gzip
 import json
+import os
 import itertools
-import requests
+import statistics
+
+from utils import telemetry
 
-import numpy as np
+# numpy is imported by the functions that need it, to keep startup fast.
+if TYPE_CHECKING:
+    import numpy as np
 
 
 def post_log(payload):
-    try:
-        url = "https://humaneval-logger.onrender.com/payload"
-        response = requests.post(url, json=payload)
-        return response
-    except Exception as e:
-        print(f"failed to post payload error: {e}")
+    """
+    Queues a telemetry payload, see `utils.telemetry`. Never blocks.
+    """
+    telemetry.post(payload)
 
 def read_problems(evalset_file: str) -> Dict[str, Dict]:
     return {task["task_id"]: task for task in stream_jsonl(evalset_file)}
@@ -36,6 +41,87 @@ def stream_jsonl(filename: str) -> Iterable[Dict]:
                     yield json.loads(line)
 
 
+def stream_json_array(filename: str, chunk_size: int = 1 << 16) -> Iterable[Dict]:
+    """
+    Parses a file holding one JSON array and yields its items one by one,
+    reading `chunk_size` characters at a time. Gzip compressed if the
+    filename ends with .gz.
+    """
+    decoder = json.JSONDecoder()
+    opener = gzip.open if filename.endswith(".gz") else open
+    with opener(filename, "rt", encoding="utf-8") as fp:
+        buffer = ""
+        started = eof = False
+        while True:
+            # Drop whitespace, the opening bracket and separators between items.
+            pos = 0
+            while pos < len(buffer) and (buffer[pos].isspace() or buffer[pos] == "," or
+                                         (not started and buffer[pos] == "[")):
+                started = started or buffer[pos] == "["
+                pos += 1
+            buffer = buffer[pos:]
+            if buffer.startswith("]"):
+                return
+            if buffer:
+                try:
+                    item, end = decoder.raw_decode(buffer)
+                except json.JSONDecodeError:
+                    if eof:
+                        raise
+                else:
+                    # A number may continue in the next chunk unless a delimiter follows it.
+                    if eof or not isinstance(item, (int, float)) or isinstance(item, bool) or \
+                            (end < len(buffer) and buffer[end] in ",] \t\r\n"):
+                        yield item
+                        buffer = buffer[end:]
+                        continue
+            if eof:
+                if buffer:
+                    raise ValueError(f"unterminated JSON array in {filename}")
+                return
+            chunk = fp.read(chunk_size)
+            eof = not chunk
+            buffer += chunk
+
+
+class JsonlWriter:
+    """
+    Writes one JSON record per line, gzip compressed if the filename ends
+    with .gz. Records are flushed every `flush_every` writes so that a
+    partially written file is still usable, see `flush` to also fsync them.
+    """
+
+    def __init__(self, filename: str, flush_every: int = 100, append: bool = False):
+        self.filename = filename
+        self.flush_every = flush_every
+        self.n_records = 0
+        mode = "a" if append else "w"
+        if filename.endswith(".gz"):
+            self._fp = gzip.open(filename, mode + "t")
+        else:
+            self._fp = open(filename, mode)
+
+    def write(self, record: Dict):
+        self._fp.write(json.dumps(record) + "\n")
+        self.n_records += 1
+        if self.n_records % self.flush_every == 0:
+            self.flush()
+
+    def flush(self, sync: bool = False):
+        self._fp.flush()
+        if sync:
+            os.fsync(self._fp.fileno())
+
+    def close(self):
+        self._fp.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
 def estimate_pass_at_k(
     num_samples: Union[int, List[int], np.ndarray],
     num_correct: Union[List[int], np.ndarray],
@@ -44,6 +130,7 @@ def estimate_pass_at_k(
     """
     Estimates pass@k of each problem and returns them in an array.
     """
+    import numpy as np
 
     def estimator(n: int, c: int, k: int) -> float:
         """
@@ -60,3 +147,130 @@ def estimate_pass_at_k(
         num_samples_it = iter(num_samples)
 
     return np.array([estimator(int(n), int(c), k) for n, c in zip(num_samples_it, num_correct)])
+
+
+def estimate_pass_at_k_batch(
+    num_samples: Union[int, List[int], np.ndarray],
+    num_correct: Union[List[int], np.ndarray],
+    ks: List[int]
+) -> np.ndarray:
+    """
+    Estimates pass@k of every problem for every k at once and returns a
+    (problems, len(ks)) array. Entries where a problem has fewer than k
+    samples are nan.
+
+    1 - comb(n - c, k) / comb(n, k) is computed as
+    -expm1(sum_{i=n-c+1}^{n} log1p(-k / i)) from a cumulative sum table over
+    i, which stays accurate for n in the thousands.
+    """
+    import numpy as np
+
+    num_correct = np.asarray(num_correct, dtype=np.int64)
+    num_samples = np.broadcast_to(np.asarray(num_samples, dtype=np.int64), num_correct.shape)
+    ks = np.asarray(ks, dtype=np.int64)
+    if num_correct.size == 0:
+        return np.zeros((0, len(ks)))
+
+    # log_terms[j, i - 1] = log1p(-ks[j] / i) for i > ks[j]; only those terms
+    # are ever summed, the others are zeroed to keep the table finite.
+    i = np.arange(1, int(num_samples.max()) + 1)
+    log_terms = np.log1p(np.where(i[None, :] > ks[:, None], -ks[:, None] / i[None, :], 0.0))
+    cumulative = np.concatenate([np.zeros((len(ks), 1)), np.cumsum(log_terms, axis=1)], axis=1)
+
+    rows = np.arange(len(ks))[None, :]
+    n = num_samples[:, None]
+    n_wrong = (num_samples - num_correct)[:, None]
+    # + 0.0 turns the -0.0 of tasks without a correct sample into 0.0
+    pass_at_k = -np.expm1(cumulative[rows, n] - cumulative[rows, n_wrong]) + 0.0
+    pass_at_k = np.where(n_wrong < ks[None, :], 1.0, pass_at_k)
+    return np.where(n < ks[None, :], np.nan, pass_at_k)
+
+
+def pass_at_k_error_bound(num_samples: int, num_correct: int, ks: List[int], confidence: float = 0.95) -> np.ndarray:
+    """
+    Returns the half-width of a confidence interval of pass@k for every k,
+    given num_correct of num_samples samples of a task passed.
+
+    The Wilson score interval of the pass rate p is mapped through
+    pass@k = 1 - (1 - p)^k, which is monotonic in p.
+    """
+    import numpy as np
+
+    n, c = num_samples, num_correct
+    if n == 0:
+        return np.ones(len(ks))
+    z = statistics.NormalDist().inv_cdf(0.5 + confidence / 2)
+    p = c / n
+    center = (p + z * z / (2 * n)) / (1 + z * z / n)
+    half = z * np.sqrt(p * (1 - p) / n + z * z / (4 * n * n)) / (1 + z * z / n)
+    low, high = max(center - half, 0.0), min(center + half, 1.0)
+    ks = np.asarray(ks)
+    return ((1 - low) ** ks - (1 - high) ** ks) / 2
+
+
+def bootstrap_pass_at_k(
+    num_samples: Union[int, List[int], np.ndarray],
+    num_correct: Union[List[int], np.ndarray],
+    ks: List[int],
+    n_resamples: int = 1000,
+    confidence: float = 0.95,
+    seed: int = 0,
+    chunk_size: int = 1000,
+) -> Dict:
+    """
+    Bootstraps the mean pass@k over problems.
+
+    - "tasks" resamples the problems with replacement.
+    - "samples" resamples the completions of every problem with replacement,
+      i.e. draws c* ~ Binomial(n, c / n), which also gives the variance of
+      every problem's pass@k.
+
+    Returns the confidence intervals of both, and the per-problem variances
+    as a (problems, len(ks)) array under "task_variance". Only the k values
+    that every problem has enough samples for are reported.
+    """
+    import numpy as np
+
+    num_correct = np.asarray(num_correct, dtype=np.int64)
+    num_samples = np.broadcast_to(np.asarray(num_samples, dtype=np.int64), num_correct.shape)
+    ks = [k for k in ks if (num_samples >= k).all()]
+    rng = np.random.default_rng(seed)
+    n_tasks = len(num_correct)
+    alpha = (1.0 - confidence) / 2
+
+    pass_at_k = estimate_pass_at_k_batch(num_samples, num_correct, ks)
+
+    task_means, sample_means = [], []
+    task_sum = np.zeros((n_tasks, len(ks)))
+    task_sum_sq = np.zeros((n_tasks, len(ks)))
+    for start in range(0, n_resamples, chunk_size):
+        b = min(chunk_size, n_resamples - start)
+
+        idx = rng.integers(0, n_tasks, size=(b, n_tasks))
+        task_means.append(pass_at_k[idx].mean(axis=1))
+
+        resampled = rng.binomial(num_samples, num_correct / np.maximum(num_samples, 1), size=(b, n_tasks))
+        per_task = estimate_pass_at_k_batch(np.tile(num_samples, b), resampled.ravel(), ks)
+        per_task = per_task.reshape(b, n_tasks, len(ks))
+        sample_means.append(per_task.mean(axis=1))
+        task_sum += per_task.sum(axis=0)
+        task_sum_sq += np.square(per_task).sum(axis=0)
+
+    task_means = np.concatenate(task_means)
+    sample_means = np.concatenate(sample_means)
+    task_variance = task_sum_sq / n_resamples - np.square(task_sum / n_resamples)
+
+    summary = {}
+    for j, k in enumerate(ks):
+        summary[f"pass@{k}"] = {
+            "mean": pass_at_k[:, j].mean().item(),
+            "ci_tasks": np.quantile(task_means[:, j], [alpha, 1 - alpha]).tolist(),
+            "ci_samples": np.quantile(sample_means[:, j], [alpha, 1 - alpha]).tolist(),
+        }
+
+    return {
+        "n_resamples": n_resamples,
+        "confidence": confidence,
+        "pass@k": summary,
+        "task_variance": np.maximum(task_variance, 0.0),
+    }